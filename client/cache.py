@@ -0,0 +1,38 @@
+"""Defines the cache of the bot's replies to read-only commands."""
+
+import time
+
+
+class TTLCache:
+    """Keeps values for 'ttl' seconds, after which they are treated as missing."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}
+
+    def get(self, key):
+        """Returns the value of 'key', or None if it is missing or has expired."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            # Drop the expired value so that the cache doesn't keep growing
+            del self.entries[key]
+            return None
+
+        return value
+
+    def set(self, key, value):
+        """Stores 'value' under 'key' for the next 'ttl' seconds."""
+        if self.ttl > 0:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key):
+        """Removes the value of 'key', if there is one."""
+        self.entries.pop(key, None)
+
+    def clear(self):
+        """Removes every value."""
+        self.entries.clear()
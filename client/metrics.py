@@ -0,0 +1,57 @@
+"""Defines the Prometheus metrics of Roundabarter Bot."""
+
+from urllib.parse import urlsplit
+
+import requests
+from prometheus_client import Counter, Histogram
+
+JOB_LAG_SECONDS = Histogram(
+    "roundabarter_bot_job_lag_seconds",
+    "Time between when a periodic scrape job was scheduled to run and when it ran.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+API_CALL_SECONDS = Histogram(
+    "roundabarter_bot_api_call_seconds",
+    "Time taken by each call to the Flask API.",
+    ["method", "route", "status"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0),
+)
+
+TELEGRAM_SEND_SECONDS = Histogram(
+    "roundabarter_bot_telegram_send_seconds",
+    "Time taken to send a notification through Telegram, including retries.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+TELEGRAM_SEND_RETRIES = Counter(
+    "roundabarter_bot_telegram_send_retries_total",
+    "Number of retried Telegram notification sends.",
+    ["error_type"],
+)
+
+TELEGRAM_SEND_FAILURES = Counter(
+    "roundabarter_bot_telegram_send_failures_total",
+    "Number of Telegram notifications that could not be sent after all retries.",
+    ["error_type"],
+)
+
+REPLY_CACHE_LOOKUPS = Counter(
+    "roundabarter_bot_reply_cache_lookups_total",
+    "Number of read-only commands answered from the reply cache (hit), through the API (miss), or through the API on request (bypass).",
+    ["command", "result"],
+)
+
+
+def record_api_call(response, *args, **kwargs):
+    """Records the time taken by a call to the Flask API in 'API_CALL_SECONDS'."""
+    # Label by the first path segment, e.g. '/get-new-listings', to keep the number of time series bounded
+    route = "/" + urlsplit(response.request.url).path.split("/")[1]
+    API_CALL_SECONDS.labels(
+        response.request.method, route, response.status_code
+    ).observe(response.elapsed.total_seconds())
+
+
+# Session used for all calls to the Flask API, which also reuses connections between calls
+api_session = requests.Session()
+api_session.hooks["response"].append(record_api_call)
@@ -1,24 +1,102 @@
 """Defines the behaviour of the Roundabarter Telegram bot."""
 
+import asyncio
+import html
 import logging
 import os
-import requests
+import random
+import re
+import time
 
+import requests
+from prometheus_client import start_http_server
 from telegram import Update
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
 from telegram.ext import (
     ApplicationBuilder,
     ContextTypes,
     CommandHandler,
 )
 
+from cache import TTLCache
+
 from decorators import restricted
 
-from utils import format_seconds
+from metrics import (
+    JOB_LAG_SECONDS,
+    REPLY_CACHE_LOOKUPS,
+    TELEGRAM_SEND_FAILURES,
+    TELEGRAM_SEND_RETRIES,
+    TELEGRAM_SEND_SECONDS,
+    api_session,
+)
+
+from tracing import TRACE_ID_HEADER, new_trace_id, span
+
+from utils import (
+    format_filters,
+    format_listing_link,
+    format_seconds,
+    get_process_age,
+    split_message,
+)
 
 # Get environment variables
 TELEGRAM_BOT_API_TOKEN = os.environ["TELEGRAM_BOT_API_TOKEN"]
 FLASK_API_URL = os.environ["FLASK_API_URL"]
 DEFAULT_SCRAPE_INTERVAL = int(os.environ["DEFAULT_SCRAPE_INTERVAL"])
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 8000))
+LIST_CACHE_TTL = int(os.environ.get("LIST_CACHE_TTL", 60))
+FETCH_CACHE_TTL = int(os.environ.get("FETCH_CACHE_TTL", 60))
+
+# Number of seconds to wait for '/get-new-listings', which scrapes several pages of search
+# results and stops fetching pages after 15 seconds, so it must wait well beyond that
+NEW_LISTINGS_TIMEOUT = 45
+
+# Number of seconds to wait for '/get-latest-listings', which serves the last known
+# listings if Carousell doesn't respond within 2 seconds
+LATEST_LISTINGS_TIMEOUT = 10
+
+# Maximum number of attempts at sending a notification through Telegram
+MAX_SEND_ATTEMPTS = 3
+
+# Number of seconds between checks of whether a new tracked search has been set up,
+# and the maximum number of checks
+STATUS_POLL_INTERVAL = 2
+MAX_STATUS_POLL_ATTEMPTS = 15
+
+# Number of seconds between attempts at restoring the jobs while the server is starting up,
+# and the maximum number of attempts
+RESTORE_RETRY_INTERVAL = 5
+MAX_RESTORE_ATTEMPTS = 60
+
+# Names and durations in seconds of the bot's start-up steps, in the order they ran
+startup_timings = []
+
+# Rendered replies to '/list', which are cleared when a tracked search is added, updated or removed
+tracked_searches_cache = TTLCache(LIST_CACHE_TTL)
+
+# Rendered replies to '/fetch' by tracked search name, which are invalidated when the
+# tracked search is added, removed, has its filters changed or has new listings
+latest_listings_cache = TTLCache(FETCH_CACHE_TTL)
+
+# Maps '/filter' command argument keys to API form fields
+FILTER_ARGUMENT_KEYS = {
+    "min": "min_price",
+    "max": "max_price",
+    "include": "include_keywords",
+    "exclude": "exclude_keywords",
+    "block": "blocked_usernames",
+    "protection": "require_buyer_protection",
+}
+
+# Maps '/search' command argument keys to API query string parameters
+SEARCH_ARGUMENT_KEYS = {
+    "min": "min_price",
+    "max": "max_price",
+    "days": "days",
+    "page": "page",
+}
 
 # Set up app logging
 logging.basicConfig(
@@ -26,12 +104,21 @@ logging.basicConfig(
 )
 
 
+def get_scheduled_jobs(job_queue):
+    """Returns the scheduled 'check_for_new_listings' jobs by the names of their tracked searches."""
+    return {
+        job.data: job
+        for job in job_queue.jobs()
+        if job.callback is check_for_new_listings
+    }
+
+
 @restricted
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Initialises the bot."""
 
     # API Call to get all tracked search names
-    response = requests.get(f"{FLASK_API_URL}/get-tracked-searches", timeout=3)
+    response = api_session.get(f"{FLASK_API_URL}/get-tracked-searches", timeout=3)
 
     if response.status_code == 400:
         # An error occurred on the back-end
@@ -44,11 +131,11 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Get the data of the tracked_searches in JSON format
         tracked_searches = response.json()
 
-        # Get the tracked search names of all currently scheduled jobs
-        job_tracked_search_names = [job.data for job in context.job_queue.jobs()]
+        # Get the currently scheduled jobs
+        scheduled_jobs = get_scheduled_jobs(context.job_queue)
 
         for tracked_search in tracked_searches:
-            if tracked_search["tracked_search_name"] not in job_tracked_search_names:
+            if tracked_search["tracked_search_name"] not in scheduled_jobs:
                 # There is no job scheduled for this tracked search
 
                 # Add the 'check_for_new_listings' job to the job queue
@@ -64,6 +151,150 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Roundabarter bot is running.")
 
 
+@restricted
+async def adopt_unsubscribed_tracked_searches(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+):
+    """Subscribes the current chat to every tracked search that no chat is subscribed to, e.g. because it predates subscriptions."""
+
+    # API Call to get all tracked search names
+    response = api_session.get(f"{FLASK_API_URL}/get-tracked-searches", timeout=3)
+
+    if response.status_code == 400:
+        # An error occurred on the back-end
+        # Reply the user with the API response's error message
+        await update.message.reply_text(response.text)
+
+    elif response.status_code == 200:
+        # Tracked searches successfully received
+
+        subscribed_tracked_search_names = []
+        for tracked_search in response.json():
+            tracked_search_name = tracked_search["tracked_search_name"]
+
+            # API call to get the chats that are subscribed to this tracked search
+            subscriptions_response = api_session.get(
+                f"{FLASK_API_URL}/get-subscriptions/{tracked_search_name}",
+                timeout=3,
+            )
+
+            if subscriptions_response.status_code == 204:
+                # No chats are subscribed to this tracked search, so subscribe this chat to it
+                subscribe_response = api_session.post(
+                    f"{FLASK_API_URL}/subscribe/{tracked_search_name}",
+                    data={"chat_id": update.message.chat_id},
+                    timeout=3,
+                )
+                if subscribe_response.status_code == 201:
+                    subscribed_tracked_search_names.append(tracked_search_name)
+
+        if len(subscribed_tracked_search_names) == 0:
+            # Reply the user
+            await update.message.reply_text(
+                "Every tracked search already has a subscribed chat."
+            )
+            return
+
+        # Tell the user which tracked searches this chat is now notified about
+        await update.message.reply_text(
+            "This chat has been subscribed to the searches that no chat was subscribed to: "
+            + ", ".join(
+                f"'{tracked_search_name}'"
+                for tracked_search_name in subscribed_tracked_search_names
+            )
+        )
+
+
+async def restore_jobs(context: ContextTypes.DEFAULT_TYPE):
+    """Schedules a 'check_for_new_listings' job for every tracked search when the bot starts, retrying until the server is ready."""
+    start_time = time.perf_counter()
+    attempts_left = context.job.data - 1
+
+    try:
+        # API call to check whether the server has finished starting up
+        ready_response = api_session.get(f"{FLASK_API_URL}/ready", timeout=3)
+
+        # API call to get all tracked searches
+        response = None
+        if ready_response.status_code == 200:
+            response = api_session.get(
+                f"{FLASK_API_URL}/get-tracked-searches", timeout=3
+            )
+    except requests.RequestException:
+        response = None
+
+    if response is None or response.status_code not in (200, 204):
+        # The server is not reachable or not ready yet
+        if attempts_left > 0:
+            context.job_queue.run_once(
+                restore_jobs, when=RESTORE_RETRY_INTERVAL, data=attempts_left
+            )
+        else:
+            logging.error(
+                "Could not restore the jobs because the server is not ready. Send /start once it is."
+            )
+        return
+
+    # No tracked searches means there are no jobs to restore
+    tracked_searches = response.json() if response.status_code == 200 else []
+
+    # Get the currently scheduled jobs
+    scheduled_jobs = get_scheduled_jobs(context.job_queue)
+
+    unsubscribed_tracked_search_names = []
+    for tracked_search in tracked_searches:
+        if tracked_search["tracked_search_name"] in scheduled_jobs:
+            # There is already a job scheduled for this tracked search
+            continue
+
+        # API call to check whether any chats are subscribed to this tracked search
+        subscriptions_response = api_session.get(
+            f"{FLASK_API_URL}/get-subscriptions/{tracked_search['tracked_search_name']}",
+            timeout=3,
+        )
+        if subscriptions_response.status_code == 204:
+            unsubscribed_tracked_search_names.append(
+                tracked_search["tracked_search_name"]
+            )
+
+        # Add the 'check_for_new_listings' job to the job queue, with the first runs
+        # spread across the interval so that the jobs don't all run together
+        context.job_queue.run_repeating(
+            check_for_new_listings,
+            interval=tracked_search["scrape_interval"],
+            first=random.uniform(0, tracked_search["scrape_interval"]),
+            data=tracked_search["tracked_search_name"],
+        )
+
+    if len(unsubscribed_tracked_search_names) > 0:
+        # These tracked searches notify nobody, e.g. because they predate subscriptions
+        logging.warning(
+            "No chats are subscribed to the searches %s, so their new listings will not be sent anywhere. "
+            "Send /adopt or /subscribe from the chats that should be notified.",
+            ", ".join(f"'{name}'" for name in unsubscribed_tracked_search_names),
+        )
+
+    logging.info(
+        "Restored the jobs of %d tracked searches in %.3fs.",
+        len(tracked_searches),
+        time.perf_counter() - start_time,
+    )
+
+
+async def post_init(application):
+    """Reports the bot's start-up timings and restores its jobs once it has connected to Telegram."""
+    startup_timings.append(
+        ("telegram_initialise", time.perf_counter() - application.bot_data["built_at"])
+    )
+    logging.info(
+        "Bot started. Start-up timings: %s",
+        ", ".join(f"{name} {seconds:.3f}s" for name, seconds in startup_timings),
+    )
+
+    # Restore the jobs in the background so that the bot starts polling straight away
+    application.job_queue.run_once(restore_jobs, when=0, data=MAX_RESTORE_ATTEMPTS)
+
+
 @restricted
 async def new_tracked_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Sets up a new tracked search."""
@@ -84,12 +315,13 @@ async def new_tracked_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
         tracked_search_url = context.args[-1]
 
         # API call to add this tracked search to the database
-        response = requests.post(
+        response = api_session.post(
             f"{FLASK_API_URL}/new-tracked-search",
             data={
                 "tracked_search_name": tracked_search_name,
                 "tracked_search_url": tracked_search_url,
                 "scrape_interval": DEFAULT_SCRAPE_INTERVAL,
+                "chat_id": update.message.chat_id,
             },
             timeout=3,
         )
@@ -99,8 +331,13 @@ async def new_tracked_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
             # Reply the user with the API response's error message
             await update.message.reply_text(response.text)
 
-        elif response.status_code == 201:
+        elif response.status_code == 202:
             # Data sucessfully added to the database
+            # The server records the current listings of this tracked search in the background
+
+            # Drop the cached replies which no longer reflect the tracked searches
+            tracked_searches_cache.clear()
+            latest_listings_cache.invalidate(tracked_search_name)
 
             # Add the 'check_for_new_listings' job to the job queue
             context.job_queue.run_repeating(
@@ -111,23 +348,162 @@ async def new_tracked_search(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 chat_id=update.message.chat_id,
             )
 
-            # Reply the user with a success message
+            # Add the 'check_tracked_search_status' job to the job queue to tell the user
+            # when the server has finished setting up this tracked search
+            context.job_queue.run_once(
+                check_tracked_search_status,
+                when=STATUS_POLL_INTERVAL,
+                data={
+                    "tracked_search_name": tracked_search_name,
+                    "attempts_left": MAX_STATUS_POLL_ATTEMPTS,
+                },
+                chat_id=update.message.chat_id,
+            )
+
+            # Reply the user with a progress message
             await update.message.reply_text(
-                f"The search '{tracked_search_name}' is now being tracked."
+                f"The search '{tracked_search_name}' is being set up."
+            )
+
+
+async def check_tracked_search_status(context: ContextTypes.DEFAULT_TYPE):
+    """Tells the user once the server has finished setting up a new tracked search."""
+
+    # Get tracked search name and number of remaining attempts from Job object
+    tracked_search_name = context.job.data["tracked_search_name"]
+    attempts_left = context.job.data["attempts_left"] - 1
+
+    # API call to get the status of this tracked search
+    response = api_session.get(
+        f"{FLASK_API_URL}/get-tracked-search-status/{tracked_search_name}",
+        timeout=3,
+    )
+
+    if response.status_code != 200:
+        # The tracked search was removed in the meantime
+        return
+
+    tracked_search_status = response.json()
+
+    if tracked_search_status["status"] == "ready":
+        # Tell the user that the tracked search is ready
+        await context.bot.send_message(
+            chat_id=context.job.chat_id,
+            text=f"The search '{tracked_search_name}' is now being tracked.",
+        )
+
+    elif tracked_search_status["status"] == "failed":
+        # Tell the user that the tracked search will be set up by its first periodic scrape
+        await context.bot.send_message(
+            chat_id=context.job.chat_id,
+            text=(
+                f"The search '{tracked_search_name}' is now being tracked, but Carousell could not be reached to set it up. "
+                "It will be set up during its first periodic scrape."
+            ),
+        )
+
+    elif attempts_left > 0:
+        # The tracked search is still being set up, so check again later
+        context.job_queue.run_once(
+            check_tracked_search_status,
+            when=STATUS_POLL_INTERVAL,
+            data={
+                "tracked_search_name": tracked_search_name,
+                "attempts_left": attempts_left,
+            },
+            chat_id=context.job.chat_id,
+        )
+
+
+async def send_notification(context: ContextTypes.DEFAULT_TYPE, chat_id, text):
+    """Sends a notification to a chat, retrying when Telegram is rate limiting or unreachable, and returns whether it was sent."""
+    start_time = time.perf_counter()
+    is_sent = False
+
+    for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+        try:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode="HTML",
+                disable_web_page_preview=True,
+            )
+            is_sent = True
+            break
+
+        except TelegramError as error:
+            # Only rate limiting, timeouts and connection errors may succeed if they are retried,
+            # whereas e.g. a chat that blocked the bot or a rejected message never will
+            is_retryable = isinstance(error, RetryAfter) or (
+                isinstance(error, NetworkError) and not isinstance(error, BadRequest)
             )
+            if not is_retryable or attempt == MAX_SEND_ATTEMPTS:
+                # Give up on this chat so that the other subscribed chats are still notified
+                TELEGRAM_SEND_FAILURES.labels(type(error).__name__).inc()
+                logging.warning(
+                    "Could not send a notification to chat %s: %s", chat_id, error
+                )
+                break
+
+            TELEGRAM_SEND_RETRIES.labels(type(error).__name__).inc()
+
+            # Wait for as long as Telegram asks, or back off exponentially
+            if isinstance(error, RetryAfter):
+                await asyncio.sleep(error.retry_after)
+            else:
+                await asyncio.sleep(2 ** (attempt - 1))
+
+    TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - start_time)
+    return is_sent
 
 
 async def check_for_new_listings(context: ContextTypes.DEFAULT_TYPE):
-    """Sends a message to the user if there are any new listings for a given tracked search."""
+    """Sends a message to every subscribed chat if there are any new listings for a given tracked search."""
+
+    # Record how late this run of the job is, which is when the next run is
+    # scheduled minus the interval between runs
+    scheduler_job = context.job.job
+    if scheduler_job.next_run_time is not None:
+        JOB_LAG_SECONDS.observe(
+            max(
+                0.0,
+                time.time()
+                - (
+                    scheduler_job.next_run_time.timestamp()
+                    - scheduler_job.trigger.interval.total_seconds()
+                ),
+            )
+        )
 
     # Get tracked search name from Job object
     tracked_search_name = context.job.data
 
+    # Start a trace for this run of the job, which the server continues
+    # through the trace ID header
+    trace_id = new_trace_id()
+
     # API call to get any new listings for this tracked search
-    response = requests.put(
-        f"{FLASK_API_URL}/get-new-listings/{tracked_search_name}",
-        timeout=3,
-    )
+    with span(
+        trace_id, "api.get_new_listings", tracked_search_name=tracked_search_name
+    ):
+        try:
+            # The scrape can take a long time, so wait for it in another thread
+            # to keep the event loop free for other jobs and commands
+            response = await asyncio.to_thread(
+                api_session.put,
+                f"{FLASK_API_URL}/get-new-listings/{tracked_search_name}",
+                headers={TRACE_ID_HEADER: trace_id},
+                timeout=NEW_LISTINGS_TIMEOUT,
+            )
+        except requests.RequestException as error:
+            # The server is unreachable or too slow
+            # Skip this run, as the next run picks up any new listings that weren't stored
+            logging.warning(
+                "Could not get the new listings of the search '%s': %s",
+                tracked_search_name,
+                error,
+            )
+            return
 
     if response.status_code == 400:
         # An error occurred on the back-end
@@ -136,42 +512,71 @@ async def check_for_new_listings(context: ContextTypes.DEFAULT_TYPE):
             "An error occurred while performing the periodic scrape.\n"
             f"API Response Error Message: {response.text}\n"
         )
-        # Send user the error message
-        await context.bot.send_message(chat_id=context.job.chat_id, text=error_message)
+        # Send user the error message, unless the job has no chat to send it to
+        if context.job.chat_id is not None:
+            await context.bot.send_message(
+                chat_id=context.job.chat_id, text=error_message
+            )
 
     elif response.status_code == 200:
         # New listings successfully retrieved
 
+        # The cached latest listings of this tracked search are now out of date
+        latest_listings_cache.invalidate(tracked_search_name)
+
         # Get the data of the new listings in JSON format
         new_listings = response.json()
 
-        # Create the message that the bot will reply the user with
-        new_listings_message = (
-            f"<i>There are {len(new_listings)} new listings for the search '{tracked_search_name}'!</i>\n"
-            if len(new_listings) > 1
-            else f"<i>There is 1 new listing for the search '{tracked_search_name}'!</i>\n"
-        )
+        # Create the lines of the message that the bot will send the user
+        new_listings_lines = [
+            (
+                f"<i>There are {len(new_listings)} new listings for the search '{tracked_search_name}'!</i>\n"
+                if len(new_listings) > 1
+                else f"<i>There is 1 new listing for the search '{tracked_search_name}'!</i>\n"
+            )
+        ]
         for listing in new_listings:
             price = listing["price"]
             if price != "FREE":
                 price = price[1:]
 
-            new_listings_message += (
-                f"{price} - <a href='{listing['url']}'>{listing['title']}</a>\n"
-            )
+            new_listings_lines.append(f"{price} - {format_listing_link(listing)}\n")
 
-        # Reply the user
-        await context.bot.send_message(
-            chat_id=context.job.chat_id,
-            text=new_listings_message,
-            parse_mode="HTML",
-            disable_web_page_preview=True,
-        )
+        # Split the listings across as many messages as Telegram's message length limit requires
+        new_listings_messages = split_message(new_listings_lines)
 
+        # API call to get the chats that are subscribed to this tracked search
+        with span(trace_id, "api.get_subscriptions"):
+            subscriptions_response = api_session.get(
+                f"{FLASK_API_URL}/get-subscriptions/{tracked_search_name}",
+                headers={TRACE_ID_HEADER: trace_id},
+                timeout=3,
+            )
 
-@restricted
-async def get_latest_listings(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Returns the latest listings of a given tracked search."""
+        if subscriptions_response.status_code == 200:
+            # Subscribed chats successfully retrieved
+            chat_ids = subscriptions_response.json()
+        else:
+            # No chats are subscribed to this tracked search, so nobody is notified
+            chat_ids = []
+
+        # Send the message to every subscribed chat
+        with span(
+            trace_id, "telegram.send_notifications", number_of_chats=len(chat_ids)
+        ):
+            for chat_id in chat_ids:
+                for new_listings_message in new_listings_messages:
+                    # Skip this chat's remaining messages if one could not be sent
+                    if not await send_notification(
+                        context, chat_id, new_listings_message
+                    ):
+                        break
+
+
+async def reply_latest_listings(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, use_cache
+):
+    """Replies with the latest listings of a given tracked search, from the cache if 'use_cache' is True and they were fetched recently."""
 
     # Validate that there is at least one argument
     if len(context.args) < 1:
@@ -182,11 +587,37 @@ async def get_latest_listings(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Concatenate all arguments with whitespaces to get the user's intended tracked search name
         tracked_search_name = " ".join(context.args)
 
+        if use_cache:
+            latest_listings_message = latest_listings_cache.get(tracked_search_name)
+            if latest_listings_message is not None:
+                REPLY_CACHE_LOOKUPS.labels("fetch", "hit").inc()
+
+                # Reply the user with the recently fetched listings
+                await update.message.reply_text(
+                    latest_listings_message,
+                    parse_mode="HTML",
+                    disable_web_page_preview=True,
+                )
+                return
+
+            REPLY_CACHE_LOOKUPS.labels("fetch", "miss").inc()
+        else:
+            REPLY_CACHE_LOOKUPS.labels("fetch", "bypass").inc()
+
         # API call to get the latest listings of this tracked search
-        response = requests.put(
-            f"{FLASK_API_URL}/get-latest-listings/{tracked_search_name}",
-            timeout=3,
-        )
+        try:
+            response = await asyncio.to_thread(
+                api_session.put,
+                f"{FLASK_API_URL}/get-latest-listings/{tracked_search_name}",
+                timeout=LATEST_LISTINGS_TIMEOUT,
+            )
+        except requests.RequestException:
+            # The server is unreachable or too slow
+            # Reply the user with an error message
+            await update.message.reply_text(
+                f"The latest listings for the search '{tracked_search_name}' could not be fetched. Please try again later."
+            )
+            return
 
         if response.status_code == 400:
             # An error occurred on the back-end
@@ -201,14 +632,20 @@ async def get_latest_listings(update: Update, context: ContextTypes.DEFAULT_TYPE
 
             # Create the message that the bot will reply the user with
             latest_listings_message = f"<i>Here are the {len(latest_listings)} most recent listings for the search '{tracked_search_name}':</i>\n"
+            is_stale = response.headers.get("X-Listings-Stale") == "true"
+            if is_stale:
+                # Carousell is unavailable, so these are the last known listings
+                latest_listings_message = f"<i>Carousell is currently unavailable. Here are the {len(latest_listings)} most recent listings that were last seen for the search '{tracked_search_name}':</i>\n"
             for listing in latest_listings:
                 price = listing["price"]
                 if price != "FREE":
                     price = price[1:]
 
-                latest_listings_message += (
-                    f"{price} - <a href='{listing['url']}'>{listing['title']}</a>\n"
-                )
+                latest_listings_message += f"{price} - {format_listing_link(listing)}\n"
+
+            # Cache the reply, unless it is stale so that the next '/fetch' tries Carousell again
+            if not is_stale:
+                latest_listings_cache.set(tracked_search_name, latest_listings_message)
 
             # Reply the user with a success message
             await update.message.reply_text(
@@ -218,12 +655,38 @@ async def get_latest_listings(update: Update, context: ContextTypes.DEFAULT_TYPE
             )
 
 
+@restricted
+async def get_latest_listings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Returns the latest listings of a given tracked search, which may have been fetched recently."""
+    await reply_latest_listings(update, context, use_cache=True)
+
+
+@restricted
+async def refetch_latest_listings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Returns the latest listings of a given tracked search, fetched from Carousell now."""
+    await reply_latest_listings(update, context, use_cache=False)
+
+
 @restricted
 async def get_tracked_searches(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Returns all currently tracked searches."""
 
+    tracked_searches_message = tracked_searches_cache.get("tracked_searches")
+    if tracked_searches_message is not None:
+        REPLY_CACHE_LOOKUPS.labels("list", "hit").inc()
+
+        # Reply the user with the recently listed tracked searches
+        await update.message.reply_text(
+            tracked_searches_message,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+        )
+        return
+
+    REPLY_CACHE_LOOKUPS.labels("list", "miss").inc()
+
     # API Call to get all tracked search names
-    response = requests.get(f"{FLASK_API_URL}/get-tracked-searches", timeout=3)
+    response = api_session.get(f"{FLASK_API_URL}/get-tracked-searches", timeout=3)
 
     if response.status_code == 400:
         # An error occurred on the back-end
@@ -232,9 +695,11 @@ async def get_tracked_searches(update: Update, context: ContextTypes.DEFAULT_TYP
 
     elif response.status_code == 204:
         # No tracked searches
+        tracked_searches_message = "No searches are currently being tracked."
+        tracked_searches_cache.set("tracked_searches", tracked_searches_message)
 
         # Reply the user
-        await update.message.reply_text("No searches are currently being tracked.")
+        await update.message.reply_text(tracked_searches_message)
 
     elif response.status_code == 200:
         # Tracked searches successfully received
@@ -254,6 +719,8 @@ async def get_tracked_searches(update: Update, context: ContextTypes.DEFAULT_TYP
             )
             tracked_searches_message += f"<a href='{tracked_search['tracked_search_url']}'>{tracked_search['tracked_search_name']}</a> ({scrape_interval_formatted})\n"
 
+        tracked_searches_cache.set("tracked_searches", tracked_searches_message)
+
         # Reply the user
         await update.message.reply_text(
             tracked_searches_message,
@@ -293,7 +760,7 @@ async def update_tracked_search_scrape_interval(
             new_scrape_interval = int(new_scrape_interval)
 
             # API call to update the scrape interval of this tracked search in the database
-            response = requests.put(
+            response = api_session.put(
                 f"{FLASK_API_URL}/update-tracked-search-scrape-interval/{tracked_search_name}",
                 data={
                     "new_scrape_interval": new_scrape_interval,
@@ -309,6 +776,9 @@ async def update_tracked_search_scrape_interval(
             elif response.status_code == 200:
                 # Tracked search scrape interval in database successfully updated
 
+                # Drop the cached replies which list the old scrape interval
+                tracked_searches_cache.clear()
+
                 # Remove the current 'check_for_new_listings' job for this tracked search from the job queue
                 # Get all currently scheduled jobs
                 jobs = context.job_queue.jobs()
@@ -347,7 +817,7 @@ async def remove_tracked_search(update: Update, context: ContextTypes.DEFAULT_TY
         tracked_search_name = " ".join(context.args)
 
         # API Call to delete data in the database that is related to this tracked search
-        response = requests.delete(
+        response = api_session.delete(
             f"{FLASK_API_URL}/delete-tracked-search/{tracked_search_name}",
             timeout=3,
         )
@@ -360,6 +830,10 @@ async def remove_tracked_search(update: Update, context: ContextTypes.DEFAULT_TY
         elif response.status_code == 200:
             # Tracked search data successfully deleted from database
 
+            # Drop the cached replies which still include this tracked search
+            tracked_searches_cache.clear()
+            latest_listings_cache.invalidate(tracked_search_name)
+
             # Remove 'check_for_new_listings' job from the job queue
             # Get all currently scheduled jobs
             jobs = context.job_queue.jobs()
@@ -375,23 +849,350 @@ async def remove_tracked_search(update: Update, context: ContextTypes.DEFAULT_TY
             )
 
 
+@restricted
+async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Subscribes the current chat to a tracked search."""
+
+    # Validate that there is at least one argument
+    if len(context.args) < 1:
+        # Reply the user with an error message
+        await update.message.reply_text("Please enter the name of a tracked search.")
+
+    else:
+        # Concatenate all arguments with whitespaces to get the user's intended tracked search name
+        tracked_search_name = " ".join(context.args)
+
+        # API call to subscribe this chat to this tracked search
+        response = api_session.post(
+            f"{FLASK_API_URL}/subscribe/{tracked_search_name}",
+            data={
+                "chat_id": update.message.chat_id,
+            },
+            timeout=3,
+        )
+
+        if response.status_code == 400:
+            # An error occurred on the back-end
+            # Reply the user with the API response's error message
+            await update.message.reply_text(response.text)
+
+        elif response.status_code == 201:
+            # Subscription successfully added to the database
+
+            # Reply the user with a success message
+            await update.message.reply_text(
+                f"This chat will now be notified of new listings for the search '{tracked_search_name}'."
+            )
+
+
+@restricted
+async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Unsubscribes the current chat from a tracked search."""
+
+    # Validate that there is at least one argument
+    if len(context.args) < 1:
+        # Reply the user with an error message
+        await update.message.reply_text("Please enter the name of a tracked search.")
+
+    else:
+        # Concatenate all arguments with whitespaces to get the user's intended tracked search name
+        tracked_search_name = " ".join(context.args)
+
+        # API call to unsubscribe this chat from this tracked search
+        response = api_session.delete(
+            f"{FLASK_API_URL}/unsubscribe/{tracked_search_name}",
+            data={
+                "chat_id": update.message.chat_id,
+            },
+            timeout=3,
+        )
+
+        if response.status_code == 400:
+            # An error occurred on the back-end
+            # Reply the user with the API response's error message
+            await update.message.reply_text(response.text)
+
+        elif response.status_code == 200:
+            # Subscription successfully deleted from the database
+
+            # Reply the user with a success message
+            await update.message.reply_text(
+                f"This chat will no longer be notified of new listings for the search '{tracked_search_name}'."
+            )
+
+
+@restricted
+async def update_tracked_search_filters(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+):
+    """Shows or updates the filters of a tracked search."""
+
+    # Split the arguments into the words of the tracked search name and the
+    # 'key=value' filter arguments that follow it
+    tracked_search_name_words = []
+    filter_form_data = {}
+    field = None
+    for arg in context.args:
+        key, separator, value = arg.partition("=")
+        if separator and key.lower() in FILTER_ARGUMENT_KEYS:
+            field = FILTER_ARGUMENT_KEYS[key.lower()]
+            filter_form_data[field] = value
+        elif field is not None:
+            # Words after a filter argument belong to its value, e.g. 'include=rtx 3080'
+            filter_form_data[field] += f" {arg}"
+        else:
+            tracked_search_name_words.append(arg)
+
+    # Validate that a tracked search name was given
+    if len(tracked_search_name_words) < 1:
+        # Reply the user with an error message
+        await update.message.reply_text("Please enter the name of a tracked search.")
+        return
+
+    # Concatenate the remaining arguments with whitespaces to get the user's intended tracked search name
+    tracked_search_name = " ".join(tracked_search_name_words)
+
+    if len(filter_form_data) == 0:
+        # No filters given, so show the current filters of this tracked search
+        response = api_session.get(
+            f"{FLASK_API_URL}/get-tracked-search-filters/{tracked_search_name}",
+            timeout=3,
+        )
+    else:
+        # API call to update the filters of this tracked search in the database
+        response = api_session.put(
+            f"{FLASK_API_URL}/update-tracked-search-filters/{tracked_search_name}",
+            data=filter_form_data,
+            timeout=3,
+        )
+
+    if response.status_code == 400:
+        # An error occurred on the back-end
+        # Reply the user with the API response's error message
+        await update.message.reply_text(response.text)
+
+    elif response.status_code == 200:
+        # Filters successfully retrieved or updated
+
+        # The cached latest listings of this tracked search may have been filtered differently
+        latest_listings_cache.invalidate(tracked_search_name)
+
+        # Reply the user with the filters of this tracked search
+        await update.message.reply_text(
+            f"<i>Filters for the search '{html.escape(tracked_search_name)}':</i>\n"
+            + format_filters(response.json()),
+            parse_mode="HTML",
+        )
+
+
+@restricted
+async def get_price_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Returns the price statistics of a tracked search."""
+
+    # Validate that there is at least one argument
+    if len(context.args) < 1:
+        # Reply the user with an error message
+        await update.message.reply_text("Please enter the name of a tracked search.")
+        return
+
+    # Get the number of days from the last argument if it is given as e.g. '30d',
+    # defaulting to the last 7 days
+    days = 7
+    tracked_search_name_words = context.args
+    if len(context.args) > 1 and re.fullmatch(r"\d+d", context.args[-1]):
+        days = int(context.args[-1][:-1])
+        tracked_search_name_words = context.args[:-1]
+
+    # Concatenate the remaining arguments with whitespaces to get the user's intended tracked search name
+    tracked_search_name = " ".join(tracked_search_name_words)
+
+    # API call to get the price statistics of this tracked search
+    response = api_session.get(
+        f"{FLASK_API_URL}/get-price-stats/{tracked_search_name}",
+        params={"days": days},
+        timeout=3,
+    )
+
+    if response.status_code == 400:
+        # An error occurred on the back-end
+        # Reply the user with the API response's error message
+        await update.message.reply_text(response.text)
+
+    elif response.status_code == 204:
+        # No price history
+
+        # Reply the user
+        await update.message.reply_text(
+            f"There is no price history for the search '{tracked_search_name}' yet."
+        )
+
+    elif response.status_code == 200:
+        # Price statistics successfully retrieved
+
+        # Get the price statistics in JSON format
+        price_stats = response.json()
+
+        # Reply the user with the price statistics
+        await update.message.reply_text(
+            f"<i>Prices for the search '{tracked_search_name}' over the last {days} days:</i>\n"
+            f"Listings: {price_stats['count']}\n"
+            f"Min: ${price_stats['min']:g}\n"
+            f"Median: ${price_stats['median']:g}\n"
+            f"90th percentile: ${price_stats['p90']:g}\n"
+            f"Max: ${price_stats['max']:g}",
+            parse_mode="HTML",
+        )
+
+
+@restricted
+async def search_listings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Returns the stored listings of all tracked searches which match a query."""
+
+    # Split the arguments into 'key=value' search arguments and the words of the query
+    query_words = []
+    params = {}
+    for arg in context.args:
+        key, separator, value = arg.partition("=")
+        if separator and key.lower() in SEARCH_ARGUMENT_KEYS:
+            params[SEARCH_ARGUMENT_KEYS[key.lower()]] = value
+        else:
+            query_words.append(arg)
+
+    # Validate that a query was given
+    if len(query_words) < 1:
+        # Reply the user with an error message
+        await update.message.reply_text("Please enter a search query.")
+        return
+
+    # Concatenate the remaining arguments with whitespaces to get the user's intended query
+    params["q"] = " ".join(query_words)
+
+    # API call to search the stored listings
+    response = api_session.get(
+        f"{FLASK_API_URL}/search-listings",
+        params=params,
+        timeout=3,
+    )
+
+    if response.status_code == 400:
+        # An error occurred on the back-end
+        # Reply the user with the API response's error message
+        await update.message.reply_text(response.text)
+
+    elif response.status_code == 200:
+        # Search results successfully retrieved
+
+        # Get the search results in JSON format
+        search_results = response.json()
+
+        if len(search_results["results"]) == 0:
+            # Reply the user
+            await update.message.reply_text(
+                f"No stored listings match the query '{params['q']}'."
+            )
+            return
+
+        # Create the message that the bot will reply the user with
+        search_results_message = f"<i>Stored listings matching '{html.escape(params['q'])}' (page {search_results['page']}):</i>\n"
+        for listing in search_results["results"]:
+            price = listing["price"]
+            if price != "FREE":
+                price = price[1:]
+
+            search_results_message += f"{price} - {format_listing_link(listing)} ({html.escape(listing['tracked_search_name'])})\n"
+
+        if search_results["has_next_page"]:
+            search_results_message += (
+                f"<i>Add page={search_results['page'] + 1} to see more results.</i>"
+            )
+
+        # Reply the user
+        await update.message.reply_text(
+            search_results_message,
+            parse_mode="HTML",
+            disable_web_page_preview=True,
+        )
+
+
+@restricted
+async def profile_next_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Profiles the next requests that the server handles."""
+
+    # Validate that there is exactly one argument which is a number
+    if len(context.args) != 1 or not context.args[0].isdigit():
+        # Reply the user with an error message
+        await update.message.reply_text(
+            "Please enter the number of requests to profile."
+        )
+        return
+
+    # API call to profile the next requests that the server handles
+    response = api_session.post(
+        f"{FLASK_API_URL}/profile-next-requests",
+        data={
+            "number_of_requests": context.args[0],
+        },
+        timeout=3,
+    )
+
+    # Reply the user with the API response's message
+    await update.message.reply_text(response.text)
+
+
 if __name__ == "__main__":
-    application = ApplicationBuilder().token(TELEGRAM_BOT_API_TOKEN).build()
+    # Time from the start of the process until the bot's modules were imported
+    process_age = get_process_age()
+    if process_age is not None:
+        startup_timings.append(("imports", process_age))
+
+    # Expose the bot's metrics in the Prometheus text format
+    step_start_time = time.perf_counter()
+    start_http_server(METRICS_PORT)
+    startup_timings.append(
+        ("start_metrics_server", time.perf_counter() - step_start_time)
+    )
+
+    step_start_time = time.perf_counter()
+    application = (
+        ApplicationBuilder().token(TELEGRAM_BOT_API_TOKEN).post_init(post_init).build()
+    )
+    startup_timings.append(("build_application", time.perf_counter() - step_start_time))
+    application.bot_data["built_at"] = time.perf_counter()
 
     start_handler = CommandHandler("start", start)
+    adopt_unsubscribed_tracked_searches_handler = CommandHandler(
+        "adopt", adopt_unsubscribed_tracked_searches
+    )
     new_tracked_search_handler = CommandHandler("new", new_tracked_search)
     get_latest_listings_handler = CommandHandler("fetch", get_latest_listings)
+    refetch_latest_listings_handler = CommandHandler("refetch", refetch_latest_listings)
     get_tracked_searches_handler = CommandHandler("list", get_tracked_searches)
     remove_tracked_search_handler = CommandHandler("remove", remove_tracked_search)
     update_tracked_search_scrape_interval_handler = CommandHandler(
         "update", update_tracked_search_scrape_interval
     )
+    subscribe_handler = CommandHandler("subscribe", subscribe)
+    unsubscribe_handler = CommandHandler("unsubscribe", unsubscribe)
+    update_tracked_search_filters_handler = CommandHandler(
+        "filter", update_tracked_search_filters
+    )
+    get_price_stats_handler = CommandHandler("stats", get_price_stats)
+    search_listings_handler = CommandHandler("search", search_listings)
+    profile_next_requests_handler = CommandHandler("profile", profile_next_requests)
 
     application.add_handler(start_handler)
+    application.add_handler(adopt_unsubscribed_tracked_searches_handler)
     application.add_handler(new_tracked_search_handler)
     application.add_handler(get_latest_listings_handler)
+    application.add_handler(refetch_latest_listings_handler)
     application.add_handler(get_tracked_searches_handler)
     application.add_handler(remove_tracked_search_handler)
     application.add_handler(update_tracked_search_scrape_interval_handler)
+    application.add_handler(subscribe_handler)
+    application.add_handler(unsubscribe_handler)
+    application.add_handler(update_tracked_search_filters_handler)
+    application.add_handler(get_price_stats_handler)
+    application.add_handler(search_listings_handler)
+    application.add_handler(profile_next_requests_handler)
 
     application.run_polling()
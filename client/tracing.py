@@ -0,0 +1,54 @@
+"""Defines tracing functions that are used for Roundabarter Bot."""
+
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+# Get environment variables
+# Tracing is disabled unless a trace file is given
+TRACE_FILE = os.environ.get("TRACE_FILE")
+
+# Name of the HTTP header that carries the trace ID between the bot and the server
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+def new_trace_id():
+    """Returns a new random trace ID."""
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def span(trace_id, name, **attributes):
+    """Records the time taken by the code in this block as a span of the trace with the given trace ID."""
+    if TRACE_FILE is None:
+        # Tracing is disabled, so do as little work as possible
+        yield
+        return
+
+    start_time = time.time()
+    start_counter = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as exception:
+        error = type(exception).__name__
+        raise
+    finally:
+        # The bot runs on a single event loop thread, so appends don't interleave
+        with open(TRACE_FILE, "a", encoding="utf-8") as trace_file:
+            trace_file.write(
+                json.dumps(
+                    {
+                        "trace_id": trace_id,
+                        "span_id": uuid.uuid4().hex[:16],
+                        "name": name,
+                        "start_time": start_time,
+                        "duration": time.perf_counter() - start_counter,
+                        "error": error,
+                        "attributes": attributes,
+                    }
+                )
+                + "\n"
+            )
@@ -1,5 +1,11 @@
 """Defines utility functions."""
 
+import html
+import os
+
+# Maximum number of characters in a Telegram message
+MAX_MESSAGE_LENGTH = 4096
+
 
 def format_seconds(seconds):
     """Formats seconds into days, hours, minutes, and seconds."""
@@ -23,3 +29,63 @@ def format_seconds(seconds):
         formatted_time += f"{seconds}s"
 
     return formatted_time.strip()
+
+
+def format_filters(filters):
+    """Formats the filters of a tracked search into one line per filter."""
+    min_price = filters["min_price"]
+    max_price = filters["max_price"]
+
+    if min_price is None and max_price is None:
+        price_range = "any"
+    elif max_price is None:
+        price_range = f"from ${min_price:g}"
+    elif min_price is None:
+        price_range = f"up to ${max_price:g}"
+    else:
+        price_range = f"${min_price:g} to ${max_price:g}"
+
+    # Escape the keywords and usernames, as the filters are sent in an HTML message
+    return (
+        f"Price: {price_range}\n"
+        f"Include: {html.escape(', '.join(filters['include_keywords'])) or 'none'}\n"
+        f"Exclude: {html.escape(', '.join(filters['exclude_keywords'])) or 'none'}\n"
+        f"Blocked sellers: {html.escape(', '.join(filters['blocked_usernames'])) or 'none'}\n"
+        f"Buyer Protection required: {'yes' if filters['require_buyer_protection'] else 'no'}"
+    )
+
+
+def format_listing_link(listing):
+    """Formats a listing into an HTML link to it, titled with the listing's title."""
+    # Escape the title and URL so that characters such as '<' and '&' don't break the HTML message
+    return f"<a href='{html.escape(listing['url'])}'>{html.escape(str(listing['title']))}</a>"
+
+
+def get_process_age():
+    """Returns the number of seconds since this process started, or None if it can't be read."""
+    try:
+        with open("/proc/self/stat", encoding="utf-8") as stat_file:
+            # The process name may contain spaces, so count the fields from after it
+            stat_fields = stat_file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", encoding="utf-8") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    # The start time is the 22nd field of the stat file, in clock ticks since boot
+    started_at = int(stat_fields[19]) / os.sysconf("SC_CLK_TCK")
+    return uptime - started_at
+
+
+def split_message(lines, max_length=MAX_MESSAGE_LENGTH):
+    """Joins lines into as few messages as possible, each with at most 'max_length' characters, without splitting a line."""
+    messages = []
+    message = ""
+    for line in lines:
+        if message and len(message) + len(line) > max_length:
+            messages.append(message)
+            message = ""
+        message += line
+    if message:
+        messages.append(message)
+    return messages
@@ -0,0 +1,161 @@
+"""Defines a stand-in for Carousell which serves synthetic search result pages for load testing."""
+
+import argparse
+import html
+import random
+import time
+import zlib
+
+from flask import Flask, request
+
+app = Flask(__name__)
+
+# Configuration, which is set from the command-line arguments
+config = {
+    "arrival_rate": 1.0,
+    "initial_listings": 100,
+    "page_size": 40,
+    "latency": 0.1,
+    "slow_probability": 0.0,
+    "slow_latency": 5.0,
+    "error_rate": 0.0,
+}
+
+# Time at which the server started, from which listing arrivals are counted
+START_TIME = time.time()
+
+
+def get_search_offset(search_query):
+    """Returns a per-search offset so that every search has its own range of listing IDs."""
+    return (zlib.crc32(search_query.encode()) % 100_000) * 1_000_000
+
+
+def get_listing_count(now):
+    """Returns the number of listings that every search has at the given time."""
+    arrivals_per_second = config["arrival_rate"] / 60
+    return config["initial_listings"] + int((now - START_TIME) * arrivals_per_second)
+
+
+def get_listing_created_at(listing_number):
+    """Returns the time at which the given listing of a search arrived."""
+    if listing_number < config["initial_listings"]:
+        return START_TIME
+    arrivals_per_second = config["arrival_rate"] / 60
+    return (
+        START_TIME + (listing_number - config["initial_listings"]) / arrivals_per_second
+    )
+
+
+def render_listing_card(listing_id, listing_number):
+    """Renders a listing card with the markup that the scraper expects."""
+    price = "FREE" if listing_number % 50 == 0 else f"S${10 + listing_number % 990:,}"
+    buyer_protection = "<p>Buyer Protection</p>" if listing_number % 3 == 0 else ""
+    bumped = "<p>Bumped</p>" if listing_number % 7 == 0 else ""
+    # The arrival time is put in the description so that the load driver can measure
+    # how long each listing took to be reported as new
+    return (
+        f'<div data-testid="listing-card-{listing_id}">'
+        f'<a href="/u/seller{listing_number % 500}/">'
+        f"<p>seller{listing_number % 500}</p><p>1 minute ago</p></a>"
+        f"{buyer_protection}{bumped}"
+        f'<a href="/p/{listing_id}/">'
+        f"<p>Synthetic listing {listing_number}</p>"
+        f"<div><p>{price}</p></div>"
+        f"<p>created_at={get_listing_created_at(listing_number):.3f}</p>"
+        f"</a></div>"
+    )
+
+
+@app.route("/search/<path:search_query>", methods=["GET"])
+def search(search_query):
+    """Returns a page of synthetic search results, newest first."""
+
+    # Inject latency, with an occasional slow response
+    latency = config["latency"]
+    if random.random() < config["slow_probability"]:
+        latency = config["slow_latency"]
+    time.sleep(latency)
+
+    # Inject errors
+    if random.random() < config["error_rate"]:
+        return ("Service Unavailable", 503)
+
+    page = int(request.args.get("page", "1"))
+    listing_count = get_listing_count(time.time())
+    search_offset = get_search_offset(search_query)
+
+    newest_listing_number = listing_count - 1 - (page - 1) * config["page_size"]
+    oldest_listing_number = max(newest_listing_number - config["page_size"], -1)
+    listing_cards = "".join(
+        render_listing_card(search_offset + listing_number, listing_number)
+        for listing_number in range(newest_listing_number, oldest_listing_number, -1)
+    )
+
+    # Link to the next page in the same way as a server-rendered results page
+    next_page_link = ""
+    if oldest_listing_number >= 0:
+        next_page_link = f'<a rel="next" href="?page={page + 1}">Next</a>'
+
+    return (
+        f"<html><head><title>{html.escape(search_query)}</title></head>"
+        f"<body><main>{listing_cards}{next_page_link}</main></body></html>"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--arrival-rate",
+        type=float,
+        default=config["arrival_rate"],
+        help="new listings per search per minute",
+    )
+    parser.add_argument(
+        "--initial-listings",
+        type=int,
+        default=config["initial_listings"],
+        help="listings every search has when the server starts",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=config["page_size"],
+        help="listings per page of search results",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=config["latency"],
+        help="seconds taken to serve each page",
+    )
+    parser.add_argument(
+        "--slow-probability",
+        type=float,
+        default=config["slow_probability"],
+        help="probability of a page being served after --slow-latency instead",
+    )
+    parser.add_argument(
+        "--slow-latency",
+        type=float,
+        default=config["slow_latency"],
+        help="seconds taken to serve a slow page",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=config["error_rate"],
+        help="probability of a page failing with a 503",
+    )
+    args = parser.parse_args()
+
+    config["arrival_rate"] = args.arrival_rate
+    config["initial_listings"] = args.initial_listings
+    config["page_size"] = args.page_size
+    config["latency"] = args.latency
+    config["slow_probability"] = args.slow_probability
+    config["slow_latency"] = args.slow_latency
+    config["error_rate"] = args.error_rate
+
+    app.run(host=args.host, port=args.port, threaded=True)
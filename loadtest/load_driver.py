@@ -0,0 +1,218 @@
+"""Simulates many tracked searches being scraped through the API and reports how the server copes."""
+
+import argparse
+import re
+import resource
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Prefix of the names of the tracked searches that the load driver creates
+TRACKED_SEARCH_NAME_PREFIX = "loadtest"
+
+
+def get_percentile(values, percentile):
+    """Returns the value at 'percentile' (0 to 100) of 'values' using the nearest-rank method."""
+    if len(values) == 0:
+        return float("nan")
+    sorted_values = sorted(values)
+    rank = max(0, int(round(percentile / 100 * len(sorted_values))) - 1)
+    return sorted_values[rank]
+
+
+def get_server_process_metrics(api_url):
+    """Returns the server's CPU seconds and resident memory from its metrics endpoint."""
+    process_metrics = {}
+    try:
+        response = requests.get(f"{api_url}/metrics", timeout=3)
+    except requests.RequestException:
+        return process_metrics
+    for line in response.text.splitlines():
+        match = re.match(
+            r"^(process_cpu_seconds_total|process_resident_memory_bytes) (\S+)$", line
+        )
+        if match:
+            process_metrics[match.group(1)] = float(match.group(2))
+    return process_metrics
+
+
+class LoadDriver:
+    """Polls the API for new listings of every tracked search, like the bot does, and records the results."""
+
+    def __init__(self, api_url, fake_carousell_url, number_of_searches, interval):
+        self.api_url = api_url
+        self.fake_carousell_url = fake_carousell_url
+        self.number_of_searches = number_of_searches
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.request_latencies = []
+        self.notification_latencies = []
+        self.status_codes = Counter()
+        self.number_of_new_listings = 0
+
+    def get_tracked_search_name(self, search_number):
+        """Returns the name of the given tracked search."""
+        return f"{TRACKED_SEARCH_NAME_PREFIX}-{search_number}"
+
+    def create_tracked_searches(self, executor):
+        """Creates the tracked searches which point at the stand-in server."""
+
+        def create(search_number):
+            tracked_search_name = self.get_tracked_search_name(search_number)
+            response = requests.post(
+                f"{self.api_url}/new-tracked-search",
+                data={
+                    "tracked_search_name": tracked_search_name,
+                    "tracked_search_url": f"{self.fake_carousell_url}/search/{tracked_search_name}",
+                    "scrape_interval": self.interval,
+                },
+                timeout=30,
+            )
+            return response.status_code
+
+        return Counter(executor.map(create, range(self.number_of_searches)))
+
+    def delete_tracked_searches(self, executor):
+        """Deletes the tracked searches which were created by 'create_tracked_searches'."""
+
+        def delete(search_number):
+            requests.delete(
+                f"{self.api_url}/delete-tracked-search/{self.get_tracked_search_name(search_number)}",
+                timeout=30,
+            )
+
+        list(executor.map(delete, range(self.number_of_searches)))
+
+    def poll(self, search_number):
+        """Gets the new listings of a tracked search once and records the results."""
+        start_time = time.perf_counter()
+        try:
+            response = requests.put(
+                f"{self.api_url}/get-new-listings/{self.get_tracked_search_name(search_number)}",
+                timeout=30,
+            )
+            status = response.status_code
+        except requests.RequestException as error:
+            response = None
+            status = type(error).__name__
+        request_latency = time.perf_counter() - start_time
+        received_at = time.time()
+
+        notification_latencies = []
+        if response is not None and status == 200:
+            for listing in response.json():
+                match = re.search(r"created_at=([\d.]+)", listing["description"] or "")
+                if match:
+                    notification_latencies.append(received_at - float(match.group(1)))
+
+        with self.lock:
+            self.request_latencies.append(request_latency)
+            self.status_codes[status] += 1
+            self.number_of_new_listings += len(notification_latencies)
+            self.notification_latencies.extend(notification_latencies)
+
+    def run(self, executor, duration):
+        """Polls every tracked search once per interval, staggered across the interval, for 'duration' seconds."""
+        start_time = time.time()
+        futures = []
+        poll_number = 0
+        while True:
+            # Spread the searches evenly across each interval, like the bot's jobs drift apart
+            scheduled_time = start_time + poll_number * (
+                self.interval / self.number_of_searches
+            )
+            if scheduled_time - start_time >= duration:
+                break
+            time.sleep(max(0.0, scheduled_time - time.time()))
+            futures.append(
+                executor.submit(self.poll, poll_number % self.number_of_searches)
+            )
+            poll_number += 1
+
+        for future in futures:
+            future.result()
+
+        return time.time() - start_time
+
+
+def main():
+    """Runs the load test and prints its report."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--api-url", default="http://localhost:5000")
+    parser.add_argument(
+        "--fake-carousell-url",
+        default="http://localhost:8080",
+        help="must match the server's CAROUSELL_BASE_URL",
+    )
+    parser.add_argument("--searches", type=int, default=1000)
+    parser.add_argument(
+        "--interval", type=float, default=60, help="seconds between scrapes"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=300, help="seconds to run the test for"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="maximum requests in flight"
+    )
+    parser.add_argument(
+        "--keep",
+        action="store_true",
+        help="keep the tracked searches after the test instead of deleting them",
+    )
+    args = parser.parse_args()
+
+    driver = LoadDriver(
+        args.api_url, args.fake_carousell_url, args.searches, args.interval
+    )
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        print(f"Creating {args.searches} tracked searches...")
+        print(f"Creation responses: {dict(driver.create_tracked_searches(executor))}")
+
+        server_metrics_before = get_server_process_metrics(args.api_url)
+        print(f"Polling for {args.duration:g}s...")
+        elapsed = driver.run(executor, args.duration)
+        server_metrics_after = get_server_process_metrics(args.api_url)
+
+        if not args.keep:
+            print("Deleting tracked searches...")
+            driver.delete_tracked_searches(executor)
+
+    number_of_requests = len(driver.request_latencies)
+    print()
+    print(f"Requests:               {number_of_requests} in {elapsed:.1f}s")
+    print(f"Throughput:             {number_of_requests / elapsed:.1f} requests/s")
+    print(f"Responses:              {dict(driver.status_codes)}")
+    print(
+        f"Request latency:        p50 {get_percentile(driver.request_latencies, 50):.3f}s"
+        f", p99 {get_percentile(driver.request_latencies, 99):.3f}s"
+    )
+    print(
+        f"New listings:           {driver.number_of_new_listings}"
+        f" ({driver.number_of_new_listings / elapsed:.1f}/s)"
+    )
+    print(
+        f"Notification latency:   p50 {get_percentile(driver.notification_latencies, 50):.1f}s"
+        f", p99 {get_percentile(driver.notification_latencies, 99):.1f}s"
+    )
+    if "process_cpu_seconds_total" in server_metrics_after:
+        server_cpu_seconds = server_metrics_after[
+            "process_cpu_seconds_total"
+        ] - server_metrics_before.get("process_cpu_seconds_total", 0.0)
+        print(
+            f"Server CPU:             {server_cpu_seconds:.1f}s"
+            f" ({100 * server_cpu_seconds / elapsed:.0f}% of one core)"
+        )
+        print(
+            f"Server memory:          {server_metrics_after['process_resident_memory_bytes'] / 2**20:.0f} MiB resident"
+        )
+    print(
+        f"Load driver memory:     {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB peak resident"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,158 @@
 """Defines API routes."""
 
+import logging
 import re
+import time
 
-from flask import Flask, request
+from flask import Flask, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 import db
+import filters
+import jobs
+import metrics
+import price_history
 import scraper
+import startup
+import tracing
+from models import CAROUSELL_BASE_URL, FAILED, READY, WARMING_UP, listings_to_dicts
 
 app = Flask(__name__)
 
-# Create 'tracked_searches' table if it does not exist
-db.create_tracked_searches_table()
+# Number of seen listings kept in the 'listings' table for each tracked search,
+# which the scraper uses to know where the new listings end
+SEEN_LISTINGS_LIMIT = 200
 
-# Create 'listings' table if it does not exist
-db.create_listings_table()
+# Number of latest listings returned for a tracked search
+LATEST_LISTINGS_LIMIT = 5
+
+# Number of seconds within which the latest listings must be scraped before the last
+# known listings are served instead, which is well within the bot's timeout for '/fetch'
+LATEST_LISTINGS_TIME_LIMIT = 2
+
+# Name of the HTTP header that marks listings served from the database because Carousell is unavailable
+STALE_HEADER = "X-Listings-Stale"
+
+# Number of results in each page of listing search results
+SEARCH_PAGE_SIZE = 10
+
+# Number of seconds a request waits for the start-up initialisation before it is turned away
+STARTUP_WAIT_TIMEOUT = 10
+
+# Endpoints which are served before the start-up initialisation has finished
+STARTUP_EXEMPT_ENDPOINTS = {"get_ready", "get_metrics"}
+
+# Set up app logging
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+)
+
+
+def record_baseline_listings(tracked_search_name, tracked_search_url):
+    """Scrapes the latest listings of a tracked search and stores them as seen, so that only later listings are reported as new."""
+
+    # Get latest listings for this tracked search
+    latest_listings = scraper.scrape_latest_listings(tracked_search_url)
+
+    # Insert new records into the 'listings' table
+    db.insert_listings(latest_listings, tracked_search_name)
+
+    # Record the prices of the latest listings in the 'price_observations' table
+    db.insert_price_observations(latest_listings, tracked_search_name, int(time.time()))
+
+
+def warm_up_tracked_search(tracked_search_name, tracked_search_url):
+    """Records the baseline listings of a new tracked search and updates its status."""
+    try:
+        record_baseline_listings(tracked_search_name, tracked_search_url)
+    except Exception as error:
+        # The baseline will be recorded by the next periodic scrape instead
+        db.upsert_tracked_search_status(tracked_search_name, FAILED, str(error))
+        raise
+
+    db.upsert_tracked_search_status(tracked_search_name, READY)
+
+
+def is_valid_chat_id(chat_id):
+    """Returns True if 'chat_id' is a Telegram chat ID, which is an integer that is negative for group chats."""
+    return re.fullmatch(r"-?\d+", chat_id) is not None
+
+
+def get_tracked_search_filters(tracked_search_name):
+    """Returns the filters of a tracked search, or the default filters if none have been set."""
+    tracked_search_filters = db.get_filters_by_tracked_search_name(tracked_search_name)
+    if tracked_search_filters is None:
+        return dict(filters.DEFAULT_FILTERS)
+    return tracked_search_filters
+
+
+@app.before_request
+def start_request_timer():
+    """Records the time at which the request started being handled."""
+    g.request_start_time = time.perf_counter()
+
+
+@app.before_request
+def start_request_trace():
+    """Continues the caller's trace, or starts a new one, and starts profiling the request if requested."""
+    g.trace_id = tracing.start_trace(request.headers.get(tracing.TRACE_ID_HEADER))
+
+    # Record the whole request as the root span of this trace in the server
+    g.request_span = tracing.span("request", method=request.method, path=request.path)
+    g.request_span.__enter__()  # pylint: disable=unnecessary-dunder-call
+
+    # Don't profile the request which turns profiling on
+    g.profiler = None
+    if request.endpoint != "profile_next_requests":
+        g.profiler = tracing.start_profiling_if_requested()
+
+
+@app.before_request
+def wait_for_startup():
+    """Holds requests until the start-up initialisation has finished, and turns them away if it takes too long."""
+    if request.endpoint in STARTUP_EXEMPT_ENDPOINTS:
+        return None
+
+    if startup.startup_error is not None:
+        # Return error response
+        return (f"The server failed to start up: {startup.startup_error}", 503)
+
+    if not startup.ready.wait(STARTUP_WAIT_TIMEOUT):
+        # Return error response
+        return ("The server is still starting up. Please try again shortly.", 503)
+
+    return None
+
+
+@app.after_request
+def record_request_time(response):
+    """Records the time taken to handle the request in 'REQUEST_SECONDS'."""
+    # Label by route pattern rather than path to keep the number of time series bounded
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(
+        time.perf_counter() - g.request_start_time
+    )
+    return response
+
+
+@app.after_request
+def add_trace_id_header(response):
+    """Returns the trace ID of the request to the caller."""
+    response.headers[tracing.TRACE_ID_HEADER] = g.trace_id
+    return response
+
+
+@app.teardown_request
+def end_request_trace(error):
+    """Ends the request's root span and writes the request's profile, if it was profiled."""
+    if "request_span" in g:
+        if error is None:
+            g.request_span.__exit__(None, None, None)
+        else:
+            g.request_span.__exit__(type(error), error, error.__traceback__)
+
+    if g.get("profiler") is not None:
+        tracing.stop_profiling(g.profiler, f"{g.trace_id}-{request.endpoint}")
 
 
 @app.route("/new-tracked-search", methods=["POST"])
@@ -24,9 +163,15 @@ def new_tracked_search():
     tracked_search_name = request.form["tracked_search_name"]
     tracked_search_url = request.form["tracked_search_url"]
     scrape_interval = request.form["scrape_interval"]
+    chat_id = request.form.get("chat_id")
+
+    # Validate that the given chat ID, if any, is a valid chat ID
+    if chat_id is not None and not is_valid_chat_id(chat_id):
+        # Return error response
+        return ("The given chat ID is not a valid chat ID.", 400)
 
     # Validate that the given tracked search URL is a valid Carousell URL
-    if not re.search("^https://www.carousell.sg/search/", tracked_search_url):
+    if not re.search(f"^{re.escape(CAROUSELL_BASE_URL)}/search/", tracked_search_url):
         # Return error response
         return ("The given search URL is not a valid Carousell search URL.", 400)
 
@@ -37,24 +182,44 @@ def new_tracked_search():
         # Return error response
         return ("The given search name is already in use.", 400)
 
+    # Verify that the given tracked search URL is not already being tracked
+    # under another name, so that the same search is only ever scraped once
+    existing_tracked_search_name = db.get_tracked_search_name_by_url(tracked_search_url)
+    if existing_tracked_search_name is not None:
+        # The given tracked search URL already exists in 'tracked_searches' table
+        # Return error response
+        return (
+            f"The given search URL is already being tracked as '{existing_tracked_search_name}'. "
+            "Subscribe to that search instead.",
+            400,
+        )
+
+    # Mark this tracked search as warming up before it is inserted, so that
+    # it is never scraped before its baseline listings have been recorded
+    db.upsert_tracked_search_status(tracked_search_name, WARMING_UP)
+
     # Insert a new record into the 'tracked_searches' table
     db.insert_tracked_search(tracked_search_name, tracked_search_url, scrape_interval)
 
-    # Get latest listings for this tracked search
-    latest_listings = scraper.scrape_latest_listings(tracked_search_url)
+    # Subscribe the chat that created this tracked search to it
+    if chat_id is not None:
+        db.insert_subscription(tracked_search_name, chat_id)
 
-    # Insert new records into the 'listings' table
-    for listing in latest_listings:
-        db.insert_listing(
-            listing["url"],
-            listing["title"],
-            listing["price"],
-            listing["username"],
-            tracked_search_name,
-        )
+    # Record the baseline listings of this tracked search in the background,
+    # so that this request doesn't wait for Carousell
+    jobs.run_in_background(
+        warm_up_tracked_search, tracked_search_name, tracked_search_url
+    )
 
-    # Return success response
-    return ("New tracked search added to the database.", 201)
+    # Return accepted response with a handle to the status of this tracked search
+    return (
+        {
+            "tracked_search_name": tracked_search_name,
+            "status": WARMING_UP,
+            "status_url": f"/get-tracked-search-status/{tracked_search_name}",
+        },
+        202,
+    )
 
 
 @app.route("/get-latest-listings/<tracked_search_name>", methods=["PUT"])
@@ -78,24 +243,38 @@ def get_latest_listings(tracked_search_name):
     tracked_search_url = db.get_tracked_search_url_by_name(tracked_search_name)
 
     # Run the scraper to get the latest listings of this tracked search
-    latest_listings = scraper.scrape_latest_listings(tracked_search_url)
+    try:
+        latest_listings = scraper.scrape_latest_listings(
+            tracked_search_url, LATEST_LISTINGS_LIMIT, LATEST_LISTINGS_TIME_LIMIT
+        )
+    except scraper.CarousellUnavailableError:
+        # Carousell is degraded or too slow, so serve the last known listings of this tracked search instead
+        stale_listings = db.get_latest_listing_documents(
+            tracked_search_name, LATEST_LISTINGS_LIMIT
+        )
+        stale_listings = filters.filter_listings(
+            stale_listings, get_tracked_search_filters(tracked_search_name)
+        )
 
-    # Delete the records for the current listings of this tracked search that are
-    # already in the 'listings' table
-    db.delete_listing(tracked_search_name)
+        # Return success response, marked as stale
+        return (listings_to_dicts(stale_listings), 200, {STALE_HEADER: "true"})
 
-    # Insert records of the latest listings into the 'listings' table
-    for listing in latest_listings:
-        db.insert_listing(
-            listing["url"],
-            listing["title"],
-            listing["price"],
-            listing["username"],
-            tracked_search_name,
-        )
+    # Insert records of the latest listings that are not already in the 'listings' table
+    db.insert_listings(latest_listings, tracked_search_name)
+
+    # Record the prices of the latest listings in the 'price_observations' table
+    db.insert_price_observations(latest_listings, tracked_search_name, int(time.time()))
+
+    # Delete the records of the oldest seen listings of this tracked search
+    db.delete_old_listings(tracked_search_name, SEEN_LISTINGS_LIMIT)
+
+    # Drop the latest listings that do not satisfy this tracked search's filters
+    latest_listings = filters.filter_listings(
+        latest_listings, get_tracked_search_filters(tracked_search_name)
+    )
 
     # Return success response
-    return (latest_listings, 200)
+    return (listings_to_dicts(latest_listings), 200)
 
 
 @app.route("/get-new-listings/<tracked_search_name>", methods=["PUT"])
@@ -105,22 +284,49 @@ def get_new_listings(tracked_search_name):
     # Get the given tracked search name's corresponding tracked search URL
     tracked_search_url = db.get_tracked_search_url_by_name(tracked_search_name)
 
-    # Run the scraper to get the latest listings of this tracked search
-    latest_listings = scraper.scrape_latest_listings(tracked_search_url)
+    # Check whether the baseline listings of this tracked search have been recorded
+    # Tracked searches without a status predate statuses and are ready
+    tracked_search_status = db.get_tracked_search_status(tracked_search_name)
+    if tracked_search_status is not None and tracked_search_status["status"] != READY:
+        if tracked_search_status["status"] == FAILED:
+            # The warm-up scrape failed, so record the baseline listings now
+            # rather than reporting every current listing as new
+            try:
+                record_baseline_listings(tracked_search_name, tracked_search_url)
+            except scraper.CarousellUnavailableError:
+                return (
+                    f"Carousell is currently unavailable, so the search '{tracked_search_name}' was not scraped.",
+                    503,
+                )
+            db.upsert_tracked_search_status(tracked_search_name, READY)
 
-    # Get the URLs of all current listings of this tracked search from the 'listings' table
-    current_listing_urls = db.get_listing_urls_by_tracked_search_name(
-        tracked_search_name
+        # Return no data response
+        return (
+            f"There are no new listings for the search '{tracked_search_name}'",
+            204,
+        )
+
+    # Get the URLs of all seen listings of this tracked search from the 'listings' table
+    seen_listing_urls = set(
+        db.get_listing_urls_by_tracked_search_name(tracked_search_name)
     )
 
-    # Check if the URL of each latest listing is the URL of any of the current listings
-    # to determine if a latest listing is a new listing
-    new_listings = []
-    for latest_listing in latest_listings:
-        if latest_listing["url"] not in current_listing_urls:
-            # The URL of this latest listing is not a URL of any of the current listings
-            # indiciating that this latest listing is a new listing
-            new_listings.append(latest_listing)
+    # Run the scraper to get the listings that are newer than every seen listing,
+    # fetching only as many pages of search results as needed to reach a seen listing
+    try:
+        new_listings = list(
+            scraper.scrape_new_listings(tracked_search_url, seen_listing_urls)
+        )
+    except scraper.CarousellUnavailableError:
+        # Carousell is degraded, so skip this scrape without failing
+        # New listings will be picked up by the next scrape
+        return (
+            f"Carousell is currently unavailable, so the search '{tracked_search_name}' was not scraped.",
+            503,
+        )
+
+    # Record the number of new listings found by this scrape
+    metrics.NEW_LISTINGS_PER_SCRAPE.observe(len(new_listings))
 
     # Check if there are any new listings
     if len(new_listings) == 0:
@@ -133,22 +339,32 @@ def get_new_listings(tracked_search_name):
         )
 
     # There is at least one new listing
-    # Delete the records for the current listings of this tracked search that are
-    # already in the 'listings' table
-    db.delete_listing(tracked_search_name)
+    # Insert records of the new listings into the 'listings' table
+    db.insert_listings(new_listings, tracked_search_name)
 
-    # Insert records of the latest listings into the 'listings' table
-    for listing in latest_listings:
-        db.insert_listing(
-            listing["url"],
-            listing["title"],
-            listing["price"],
-            listing["username"],
-            tracked_search_name,
+    # Record the prices of the new listings in the 'price_observations' table
+    db.insert_price_observations(new_listings, tracked_search_name, int(time.time()))
+
+    # Delete the records of the oldest seen listings of this tracked search
+    db.delete_old_listings(tracked_search_name, SEEN_LISTINGS_LIMIT)
+
+    # Drop the new listings that do not satisfy this tracked search's filters
+    # All new listings are still stored above so that filtered-out listings
+    # are not reported as new on the next scrape
+    new_listings = filters.filter_listings(
+        new_listings, get_tracked_search_filters(tracked_search_name)
+    )
+
+    # Check if any new listings remain after filtering
+    if len(new_listings) == 0:
+        # Return no data response
+        return (
+            f"There are no new listings for the search '{tracked_search_name}' that match its filters",
+            204,
         )
 
     # Return success response
-    return (new_listings, 200)
+    return (listings_to_dicts(new_listings), 200)
 
 
 @app.route("/get-tracked-searches", methods=["GET"])
@@ -223,5 +439,332 @@ def delete_tracked_search(tracked_search_name):
     # Delete this tracked search's listings
     db.delete_listing(tracked_search_name)
 
+    # Delete this tracked search's subscriptions
+    db.delete_subscriptions_by_tracked_search_name(tracked_search_name)
+
+    # Delete this tracked search's filters
+    db.delete_filters(tracked_search_name)
+
+    # Delete this tracked search's status
+    db.delete_tracked_search_status(tracked_search_name)
+
+    # Delete this tracked search's full-text search documents
+    db.delete_listing_documents(tracked_search_name)
+
+    # Delete this tracked search's price history
+    db.delete_price_observations(tracked_search_name)
+    db.delete_price_rollups(tracked_search_name)
+
     # Return success response
     return (f"The search '{tracked_search_name}' has been deleted.", 200)
+
+
+@app.route("/subscribe/<tracked_search_name>", methods=["POST"])
+def subscribe(tracked_search_name):
+    """Subscribes a chat to a tracked search."""
+
+    # Get POST request form data
+    chat_id = request.form["chat_id"]
+
+    # Validate that the given chat ID is a valid chat ID
+    if not is_valid_chat_id(chat_id):
+        # Return error response
+        return ("The given chat ID is not a valid chat ID.", 400)
+
+    # Get all the tracked search names that are in the 'tracked_searches' table
+    valid_tracked_search_names = db.get_tracked_search_names()
+
+    # Verify that the given tracked search name is a pre-existing one
+    # in the 'tracked_searches' table
+    if tracked_search_name not in valid_tracked_search_names:
+        # Tracked search name is invalid as it doesn't exist in the 'tracked_searches' table
+        # Return error response
+        return (
+            f"The search '{tracked_search_name}' is not currently being tracked.",
+            400,
+        )
+
+    # Insert a new record into the 'subscriptions' table
+    db.insert_subscription(tracked_search_name, chat_id)
+
+    # Return success response
+    return (f"Subscribed to the search '{tracked_search_name}'.", 201)
+
+
+@app.route("/unsubscribe/<tracked_search_name>", methods=["DELETE"])
+def unsubscribe(tracked_search_name):
+    """Unsubscribes a chat from a tracked search."""
+
+    # Get DELETE request form data
+    chat_id = request.form["chat_id"]
+
+    # Validate that the given chat ID is a valid chat ID
+    if not is_valid_chat_id(chat_id):
+        # Return error response
+        return ("The given chat ID is not a valid chat ID.", 400)
+
+    # Verify that the given chat is subscribed to the given tracked search
+    subscription_chat_ids = db.get_subscription_chat_ids_by_tracked_search_name(
+        tracked_search_name
+    )
+    if int(chat_id) not in subscription_chat_ids:
+        # Return error response
+        return (f"You are not subscribed to the search '{tracked_search_name}'.", 400)
+
+    # Delete the record from the 'subscriptions' table
+    db.delete_subscription(tracked_search_name, chat_id)
+
+    # Return success response
+    return (f"Unsubscribed from the search '{tracked_search_name}'.", 200)
+
+
+@app.route("/get-subscriptions/<tracked_search_name>", methods=["GET"])
+def get_subscriptions(tracked_search_name):
+    """Returns the chat IDs of all chats subscribed to a tracked search."""
+
+    # Get the chat IDs of all subscriptions of this tracked search
+    subscription_chat_ids = db.get_subscription_chat_ids_by_tracked_search_name(
+        tracked_search_name
+    )
+
+    if len(subscription_chat_ids) == 0:
+        # No chats are subscribed to this tracked search
+
+        # Return response
+        return (f"No chats are subscribed to the search '{tracked_search_name}'", 204)
+
+    # Return success response
+    return (subscription_chat_ids, 200)
+
+
+@app.route("/get-tracked-search-filters/<tracked_search_name>", methods=["GET"])
+def get_tracked_search_filters_route(tracked_search_name):
+    """Returns the filters of a tracked search."""
+
+    # Get all the tracked search names that are in the 'tracked_searches' table
+    valid_tracked_search_names = db.get_tracked_search_names()
+
+    # Verify that the given tracked search name is a pre-existing one
+    # in the 'tracked_searches' table
+    if tracked_search_name not in valid_tracked_search_names:
+        # Tracked search name is invalid as it doesn't exist in the 'tracked_searches' table
+        # Return error response
+        return (
+            f"The search '{tracked_search_name}' is not currently being tracked.",
+            400,
+        )
+
+    # Return success response
+    return (get_tracked_search_filters(tracked_search_name), 200)
+
+
+@app.route("/update-tracked-search-filters/<tracked_search_name>", methods=["PUT"])
+def update_tracked_search_filters(tracked_search_name):
+    """Updates the filters of a tracked search."""
+
+    # Get all the tracked search names that are in the 'tracked_searches' table
+    valid_tracked_search_names = db.get_tracked_search_names()
+
+    # Verify that the given tracked search name is a pre-existing one
+    # in the 'tracked_searches' table
+    if tracked_search_name not in valid_tracked_search_names:
+        # Tracked search name is invalid as it doesn't exist in the 'tracked_searches' table
+        # Return error response
+        return (
+            f"The search '{tracked_search_name}' is not currently being tracked.",
+            400,
+        )
+
+    # Merge the PUT request form data into the current filters of this tracked search
+    try:
+        new_filters = filters.parse_filters_form(
+            request.form, get_tracked_search_filters(tracked_search_name)
+        )
+    except ValueError:
+        # A price bound is not a number
+        # Return error response
+        return ("The given minimum or maximum price is not a valid number.", 400)
+
+    # Update the filters of this tracked search
+    db.upsert_filters(tracked_search_name, new_filters)
+
+    # Return success response
+    return (new_filters, 200)
+
+
+@app.route("/get-price-stats/<tracked_search_name>", methods=["GET"])
+def get_price_stats(tracked_search_name):
+    """Returns the price statistics of a tracked search over a number of days."""
+
+    # Get the number of days from the query string, defaulting to the last 7 days
+    days = request.args.get("days", "7")
+
+    # Validate that the number of days is a positive integer
+    if not days.isdigit() or int(days) < 1:
+        # Return error response
+        return ("The given number of days is not a valid number of days.", 400)
+
+    # Get all the tracked search names that are in the 'tracked_searches' table
+    valid_tracked_search_names = db.get_tracked_search_names()
+
+    # Verify that the given tracked search name is a pre-existing one
+    # in the 'tracked_searches' table
+    if tracked_search_name not in valid_tracked_search_names:
+        # Tracked search name is invalid as it doesn't exist in the 'tracked_searches' table
+        # Return error response
+        return (
+            f"The search '{tracked_search_name}' is not currently being tracked.",
+            400,
+        )
+
+    # Get the price statistics of this tracked search from the price roll-ups
+    price_stats = price_history.get_price_stats(tracked_search_name, int(days))
+
+    if price_stats is None:
+        # No prices have been rolled up for this tracked search in this time window
+
+        # Return no data response
+        return (
+            f"There is no price history for the search '{tracked_search_name}'",
+            204,
+        )
+
+    # Return success response
+    return (price_stats, 200)
+
+
+@app.route("/search-listings", methods=["GET"])
+def search_listings():
+    """Returns the stored listings which best match a full-text query, one page at a time."""
+
+    # Get the query string parameters
+    query = request.args.get("q", "").strip()
+    min_price = request.args.get("min_price")
+    max_price = request.args.get("max_price")
+    days = request.args.get("days")
+    page = request.args.get("page", "1")
+
+    # Validate that a query was given
+    if not query:
+        # Return error response
+        return ("Please enter a search query.", 400)
+
+    # Validate the price bounds, number of days and page number
+    try:
+        min_price = float(min_price) if min_price else None
+        max_price = float(max_price) if max_price else None
+        days = int(days) if days else None
+        page = int(page)
+    except ValueError:
+        # Return error response
+        return ("The given price, number of days or page number is not valid.", 400)
+    if page < 1 or (days is not None and days < 1):
+        # Return error response
+        return ("The given number of days or page number is not valid.", 400)
+
+    # Quote each word of the query so that it is matched literally rather than
+    # as full-text query syntax, e.g. 'rtx 3080' becomes '"rtx" "3080"'
+    match_query = " ".join(
+        '"' + word.replace('"', '""') + '"' for word in query.split()
+    )
+
+    # Only match listings that were first seen within the given number of days
+    since_seen_at = 0 if days is None else int(time.time()) - days * 86400
+
+    # Get one more result than the page size to know if there is a next page
+    results = db.search_listing_documents(
+        match_query,
+        min_price,
+        max_price,
+        since_seen_at,
+        SEARCH_PAGE_SIZE + 1,
+        (page - 1) * SEARCH_PAGE_SIZE,
+    )
+
+    # Return success response
+    return (
+        {
+            "results": results[:SEARCH_PAGE_SIZE],
+            "page": page,
+            "has_next_page": len(results) > SEARCH_PAGE_SIZE,
+        },
+        200,
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Returns the server's metrics in the Prometheus text format."""
+    return (generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST})
+
+
+@app.route("/ready", methods=["GET"])
+def get_ready():
+    """Returns whether the server has finished starting up, and how long each start-up step took."""
+    startup_report = startup.get_startup_report()
+
+    if not startup_report["ready"]:
+        # Return error response
+        return (startup_report, 503)
+
+    # Return success response
+    return (startup_report, 200)
+
+
+@app.route("/profile-next-requests", methods=["POST"])
+def profile_next_requests():
+    """Profiles the next requests that the server handles."""
+
+    # Get POST request form data
+    number_of_requests = request.form["number_of_requests"]
+
+    # Validate that the number of requests is a positive integer
+    if not number_of_requests.isdigit() or int(number_of_requests) < 1:
+        # Return error response
+        return ("The given number of requests is not a valid number.", 400)
+
+    # Profile the next requests
+    tracing.profile_next_requests(int(number_of_requests))
+
+    # Return success response
+    return (
+        f"The next {number_of_requests} requests will be profiled and their profiles written to '{tracing.PROFILE_DIRECTORY}'.",
+        200,
+    )
+
+
+@app.route("/get-tracked-search-status/<tracked_search_name>", methods=["GET"])
+def get_tracked_search_status(tracked_search_name):
+    """Returns the status of a tracked search's warm-up scrape."""
+
+    # Get all the tracked search names that are in the 'tracked_searches' table
+    valid_tracked_search_names = db.get_tracked_search_names()
+
+    # Verify that the given tracked search name is a pre-existing one
+    # in the 'tracked_searches' table
+    if tracked_search_name not in valid_tracked_search_names:
+        # Tracked search name is invalid as it doesn't exist in the 'tracked_searches' table
+        # Return error response
+        return (
+            f"The search '{tracked_search_name}' is not currently being tracked.",
+            400,
+        )
+
+    # Get the status of this tracked search
+    tracked_search_status = db.get_tracked_search_status(tracked_search_name)
+    if tracked_search_status is None:
+        # Tracked searches without a status predate statuses and are ready
+        tracked_search_status = {
+            "tracked_search_name": tracked_search_name,
+            "status": READY,
+            "error": None,
+            "updated_at": None,
+        }
+
+    # Return success response
+    return (tracked_search_status, 200)
+
+
+# Create the tables, warm up the caches and start the background jobs without
+# holding up the server from accepting connections
+startup.start_initialisation()
@@ -0,0 +1,87 @@
+"""Defines a circuit breaker which stops requests to a host that keeps failing."""
+
+import threading
+import time
+
+import metrics
+
+# Number of consecutive failures after which the circuit opens
+FAILURE_THRESHOLD = 5
+
+# Number of seconds the circuit stays open before probe requests are let through
+RESET_TIMEOUT = 30
+
+# Number of probe requests that may be in flight while the circuit is half-open
+HALF_OPEN_MAX_PROBES = 1
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a request while the circuit is open."""
+
+
+class CircuitBreaker:
+    """Tracks the consecutive failures of requests to a host and short-circuits requests while it is failing."""
+
+    def __init__(self, host):
+        self.host = host
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        metrics.CIRCUIT_BREAKER_OPEN.labels(host).set(0)
+
+    def before_request(self):
+        """Raises 'CircuitOpenError' if a request to the host should not be made now."""
+        with self.lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < RESET_TIMEOUT:
+                    raise CircuitOpenError(
+                        f"Requests to {self.host} are paused after {self.consecutive_failures} consecutive failures."
+                    )
+                # Let probe requests through to find out if the host has recovered
+                self.state = HALF_OPEN
+                self.probes_in_flight = 0
+
+            if self.state == HALF_OPEN:
+                if self.probes_in_flight >= HALF_OPEN_MAX_PROBES:
+                    raise CircuitOpenError(
+                        f"Requests to {self.host} are paused while probing whether it has recovered."
+                    )
+                self.probes_in_flight += 1
+
+    def record_success(self):
+        """Closes the circuit after a successful request."""
+        with self.lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.probes_in_flight = 0
+            metrics.CIRCUIT_BREAKER_OPEN.labels(self.host).set(0)
+
+    def record_failure(self):
+        """Opens the circuit after too many consecutive failures, or after a failed probe request."""
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or (
+                self.consecutive_failures >= FAILURE_THRESHOLD
+            ):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.probes_in_flight = 0
+                metrics.CIRCUIT_BREAKER_OPEN.labels(self.host).set(1)
+
+
+circuit_breakers = {}
+circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(host):
+    """Returns the circuit breaker of the given host, creating it if it doesn't exist."""
+    with circuit_breakers_lock:
+        if host not in circuit_breakers:
+            circuit_breakers[host] = CircuitBreaker(host)
+        return circuit_breakers[host]
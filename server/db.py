@@ -1,12 +1,23 @@
 """Defines database methods."""
 
+import json
 import os
 import sqlite3
+import time
+
+import metrics
+import tracing
+from models import CAROUSELL_BASE_URL, Listing
 
 # Get environment variables
 DATABASE_LOCATION = os.environ["DATABASE_LOCATION"]
 
 
+def instrumented(func):
+    """Records the time taken by each call of the 'func' database function as a metric and as a trace span."""
+    return tracing.traced(f"db.{func.__name__}")(metrics.timed_db_call(func))
+
+
 def connect_to_db():
     """Establishes a connection to the database and returns that connection."""
 
@@ -15,6 +26,7 @@ def connect_to_db():
     return conn
 
 
+@instrumented
 def create_tracked_searches_table():
     """Creates the 'tracked_searches' table if it doesn't exist."""
     conn = connect_to_db()
@@ -32,6 +44,7 @@ def create_tracked_searches_table():
     conn.close()
 
 
+@instrumented
 def insert_tracked_search(tracked_search_name, tracked_search_url, scrape_interval):
     """Inserts a record into the 'tracked_searches' table."""
     conn = connect_to_db()
@@ -47,6 +60,7 @@ def insert_tracked_search(tracked_search_name, tracked_search_url, scrape_interv
     conn.close()
 
 
+@instrumented
 def get_tracked_searches():
     """Returns all records in the 'tracked_searches' table."""
     conn = connect_to_db()
@@ -71,6 +85,7 @@ def get_tracked_searches():
     return tracked_searches
 
 
+@instrumented
 def get_tracked_search_names():
     """Returns the 'tracked_search_name' field of all records in the 'tracked_searches' table."""
     conn = connect_to_db()
@@ -89,6 +104,27 @@ def get_tracked_search_names():
     return tracked_search_names
 
 
+@instrumented
+def get_tracked_search_name_by_url(tracked_search_url):
+    """Returns the 'tracked_search_name' field of the record in the 'tracked_searches' table which has the matching 'tracked_search_url', or None if there is no such record."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            SELECT tracked_search_name
+            FROM tracked_searches
+            WHERE tracked_search_url = ?
+        """,
+        (tracked_search_url,),
+    )
+    row = cur.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return row["tracked_search_name"]
+
+
+@instrumented
 def get_tracked_search_url_by_name(tracked_search_name):
     """Returns the 'tracked_search_url' field of the record in the 'tracked_searches' table which has the matching 'tracked_search_name'."""
     conn = connect_to_db()
@@ -106,6 +142,7 @@ def get_tracked_search_url_by_name(tracked_search_name):
     return row["tracked_search_url"]
 
 
+@instrumented
 def update_tracked_search_scrape_interval(tracked_search_name, new_scrape_interval):
     """Updates the 'scrape_interval' field of the record in the 'tracked_searches' table which has the matching 'tracked_search_name'."""
     conn = connect_to_db()
@@ -122,6 +159,7 @@ def update_tracked_search_scrape_interval(tracked_search_name, new_scrape_interv
     conn.close()
 
 
+@instrumented
 def delete_tracked_search(tracked_search_name):
     """Deletes the record in the 'tracked_searches' table which has the matching 'tracked_search_name'."""
     conn = connect_to_db()
@@ -138,6 +176,7 @@ def delete_tracked_search(tracked_search_name):
     conn.close()
 
 
+@instrumented
 def drop_tracked_searches_table():
     """Drops the 'tracked_searches' table."""
     conn = connect_to_db()
@@ -151,6 +190,7 @@ def drop_tracked_searches_table():
     conn.close()
 
 
+@instrumented
 def create_listings_table():
     """Creates the 'listings' table if it doesn't exist."""
     conn = connect_to_db()
@@ -172,6 +212,7 @@ def create_listings_table():
     conn.close()
 
 
+@instrumented
 def insert_listing(url, title, price, username, tracked_search_name):
     """Inserts a record into the 'listings' table."""
     conn = connect_to_db()
@@ -187,6 +228,58 @@ def insert_listing(url, title, price, username, tracked_search_name):
     conn.close()
 
 
+@instrumented
+def insert_listings(listings, tracked_search_name):
+    """Inserts a record into the 'listings' table and the 'listing_documents' table for each of the given 'Listing' records that isn't already in them, in a single transaction."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    # Insert the listings oldest first, as they are given newest first, so that the newest
+    # listings get the highest rowids and are the ones kept by 'delete_old_listings'
+    cur.executemany(
+        """
+            INSERT OR IGNORE INTO listings
+            VALUES (?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                listing.url,
+                listing.title,
+                listing.price,
+                listing.username,
+                tracked_search_name,
+            )
+            for listing in reversed(listings)
+        ],
+    )
+    # The 'listing_documents_fts' index is updated by the 'listing_documents' triggers
+    # as part of this same transaction
+    seen_at = int(time.time())
+    cur.executemany(
+        """
+            INSERT OR IGNORE INTO listing_documents
+                (listing_id, tracked_search_name, title, description, username, price, price_value, seen_at, protection)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                listing.listing_id,
+                tracked_search_name,
+                listing.title or "",
+                listing.description or "",
+                listing.username or "",
+                listing.price,
+                listing.price_value,
+                seen_at,
+                listing.protection,
+            )
+            for listing in listings
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
 def get_listings_by_tracked_search_name(tracked_search_name):
     """Returns all records in the 'listings' table which have the matching 'tracked_search_name'."""
     conn = connect_to_db()
@@ -214,6 +307,7 @@ def get_listings_by_tracked_search_name(tracked_search_name):
     return listings
 
 
+@instrumented
 def get_listing_urls_by_tracked_search_name(tracked_search_name):
     """Returns the 'url' field of all records in the 'listings' table which have the matching 'tracked_search_name'."""
     conn = connect_to_db()
@@ -234,6 +328,7 @@ def get_listing_urls_by_tracked_search_name(tracked_search_name):
     return urls
 
 
+@instrumented
 def delete_listing(tracked_search_name):
     """Deletes all records in the 'listings' table which have the matching 'tracked_search_name'."""
     conn = connect_to_db()
@@ -249,6 +344,30 @@ def delete_listing(tracked_search_name):
     conn.close()
 
 
+@instrumented
+def delete_old_listings(tracked_search_name, number_of_listings_to_keep):
+    """Deletes all but the most recently inserted 'number_of_listings_to_keep' records in the 'listings' table which have the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM listings
+            WHERE tracked_search_name = ?
+            AND rowid NOT IN (
+                SELECT rowid
+                FROM listings
+                WHERE tracked_search_name = ?
+                ORDER BY rowid DESC
+                LIMIT ?
+            )
+        """,
+        (tracked_search_name, tracked_search_name, number_of_listings_to_keep),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
 def drop_listings_table():
     """Drops the 'listings' table."""
     conn = connect_to_db()
@@ -260,3 +379,908 @@ def drop_listings_table():
     )
     conn.commit()
     conn.close()
+
+
+@instrumented
+def create_subscriptions_table():
+    """Creates the 'subscriptions' table if it doesn't exist."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            CREATE TABLE IF NOT EXISTS subscriptions (
+                tracked_search_name TEXT NOT NULL,
+                chat_id INTEGER NOT NULL,
+                PRIMARY KEY (tracked_search_name, chat_id)
+                FOREIGN KEY(tracked_search_name) REFERENCES tracked_searches(tracked_search_name)
+            )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def insert_subscription(tracked_search_name, chat_id):
+    """Inserts a record into the 'subscriptions' table if it doesn't already exist."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            INSERT OR IGNORE INTO subscriptions
+            VALUES (?, ?)
+        """,
+        (tracked_search_name, chat_id),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def get_subscription_chat_ids_by_tracked_search_name(tracked_search_name):
+    """Returns the 'chat_id' field of all records in the 'subscriptions' table which have the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            SELECT chat_id
+            FROM subscriptions
+            WHERE tracked_search_name = ?
+        """,
+        (tracked_search_name,),
+    )
+    rows = cur.fetchall()
+    chat_ids = []
+    for row in rows:
+        chat_ids.append(int(row["chat_id"]))
+    conn.close()
+    return chat_ids
+
+
+@instrumented
+def delete_subscription(tracked_search_name, chat_id):
+    """Deletes the record in the 'subscriptions' table which has the matching 'tracked_search_name' and 'chat_id'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM subscriptions
+            WHERE tracked_search_name = ? AND chat_id = ?
+        """,
+        (tracked_search_name, chat_id),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def delete_subscriptions_by_tracked_search_name(tracked_search_name):
+    """Deletes all records in the 'subscriptions' table which have the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM subscriptions
+            WHERE tracked_search_name = ?
+        """,
+        (tracked_search_name,),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def drop_subscriptions_table():
+    """Drops the 'subscriptions' table."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DROP TABLE subscriptions
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def create_filters_table():
+    """Creates the 'filters' table if it doesn't exist."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            CREATE TABLE IF NOT EXISTS filters (
+                tracked_search_name TEXT PRIMARY KEY NOT NULL,
+                min_price REAL,
+                max_price REAL,
+                include_keywords TEXT NOT NULL,
+                exclude_keywords TEXT NOT NULL,
+                blocked_usernames TEXT NOT NULL,
+                require_buyer_protection INTEGER NOT NULL,
+                FOREIGN KEY(tracked_search_name) REFERENCES tracked_searches(tracked_search_name)
+            )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def upsert_filters(tracked_search_name, filters):
+    """Inserts or replaces the record in the 'filters' table which has the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            INSERT OR REPLACE INTO filters
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            tracked_search_name,
+            filters["min_price"],
+            filters["max_price"],
+            json.dumps(filters["include_keywords"]),
+            json.dumps(filters["exclude_keywords"]),
+            json.dumps(filters["blocked_usernames"]),
+            int(filters["require_buyer_protection"]),
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def get_filters_by_tracked_search_name(tracked_search_name):
+    """Returns the record in the 'filters' table which has the matching 'tracked_search_name', or None if there is no such record."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            SELECT *
+            FROM filters
+            WHERE tracked_search_name = ?
+        """,
+        (tracked_search_name,),
+    )
+    row = cur.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return {
+        "min_price": row["min_price"],
+        "max_price": row["max_price"],
+        "include_keywords": json.loads(row["include_keywords"]),
+        "exclude_keywords": json.loads(row["exclude_keywords"]),
+        "blocked_usernames": json.loads(row["blocked_usernames"]),
+        "require_buyer_protection": bool(row["require_buyer_protection"]),
+    }
+
+
+@instrumented
+def delete_filters(tracked_search_name):
+    """Deletes the record in the 'filters' table which has the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM filters
+            WHERE tracked_search_name = ?
+        """,
+        (tracked_search_name,),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def drop_filters_table():
+    """Drops the 'filters' table."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DROP TABLE filters
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def create_price_observations_table():
+    """Creates the append-only 'price_observations' table and its indexes if they don't exist."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            CREATE TABLE IF NOT EXISTS price_observations (
+                listing_id INTEGER NOT NULL,
+                tracked_search_name TEXT NOT NULL,
+                price_value REAL,
+                seen_at INTEGER NOT NULL
+            )
+        """
+    )
+    cur.execute(
+        """
+            CREATE INDEX IF NOT EXISTS price_observations_by_search_and_time
+            ON price_observations (tracked_search_name, seen_at)
+        """
+    )
+    cur.execute(
+        """
+            CREATE INDEX IF NOT EXISTS price_observations_by_time
+            ON price_observations (seen_at)
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def insert_price_observations(listings, tracked_search_name, seen_at):
+    """Inserts a record into the 'price_observations' table for each of the given 'Listing' records in a single transaction."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.executemany(
+        """
+            INSERT INTO price_observations
+            VALUES (?, ?, ?, ?)
+        """,
+        [
+            (listing.listing_id, tracked_search_name, listing.price_value, seen_at)
+            for listing in listings
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def get_daily_listing_prices(since_seen_at):
+    """Returns the last observed price of each listing on each day, for all records in the 'price_observations' table seen at or after 'since_seen_at'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            SELECT tracked_search_name, date(seen_at, 'unixepoch') AS day, price_value, MAX(seen_at)
+            FROM price_observations
+            WHERE seen_at >= ? AND price_value IS NOT NULL
+            GROUP BY tracked_search_name, day, listing_id
+        """,
+        (since_seen_at,),
+    )
+    rows = cur.fetchall()
+    daily_listing_prices = []
+    for row in rows:
+        daily_listing_prices.append(
+            (row["tracked_search_name"], row["day"], row["price_value"])
+        )
+    conn.close()
+    return daily_listing_prices
+
+
+@instrumented
+def delete_price_observations(tracked_search_name):
+    """Deletes all records in the 'price_observations' table which have the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM price_observations
+            WHERE tracked_search_name = ?
+        """,
+        (tracked_search_name,),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def delete_price_observations_before(seen_at, batch_size):
+    """Deletes up to 'batch_size' records in the 'price_observations' table which were seen before 'seen_at', and returns the number of deleted records."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM price_observations
+            WHERE rowid IN (
+                SELECT rowid
+                FROM price_observations
+                WHERE seen_at < ?
+                LIMIT ?
+            )
+        """,
+        (seen_at, batch_size),
+    )
+    number_of_deleted_records = cur.rowcount
+    conn.commit()
+    conn.close()
+    return number_of_deleted_records
+
+
+@instrumented
+def drop_price_observations_table():
+    """Drops the 'price_observations' table."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DROP TABLE price_observations
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def create_price_rollups_table():
+    """Creates the 'price_rollups' table if it doesn't exist."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            CREATE TABLE IF NOT EXISTS price_rollups (
+                tracked_search_name TEXT NOT NULL,
+                day TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                min_price REAL NOT NULL,
+                max_price REAL NOT NULL,
+                PRIMARY KEY (tracked_search_name, day, bucket)
+            )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def replace_price_rollups(since_day, price_rollups):
+    """Replaces all records in the 'price_rollups' table from 'since_day' onwards with the given records in a single transaction."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM price_rollups
+            WHERE day >= ?
+        """,
+        (since_day,),
+    )
+    cur.executemany(
+        """
+            INSERT INTO price_rollups
+            VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        price_rollups,
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def get_latest_price_rollup_day():
+    """Returns the latest 'day' field in the 'price_rollups' table, or None if the table is empty."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            SELECT MAX(day) AS day
+            FROM price_rollups
+        """
+    )
+    row = cur.fetchone()
+    conn.close()
+    return row["day"]
+
+
+@instrumented
+def get_price_rollups(tracked_search_name, from_day):
+    """Returns the bucket, count, minimum price and maximum price of all records in the 'price_rollups' table which have the matching 'tracked_search_name' from 'from_day' onwards, merged across days."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            SELECT bucket, SUM(count) AS count, MIN(min_price) AS min_price, MAX(max_price) AS max_price
+            FROM price_rollups
+            WHERE tracked_search_name = ? AND day >= ?
+            GROUP BY bucket
+            ORDER BY bucket
+        """,
+        (tracked_search_name, from_day),
+    )
+    rows = cur.fetchall()
+    price_rollups = []
+    for row in rows:
+        price_rollups.append(
+            {
+                "bucket": row["bucket"],
+                "count": row["count"],
+                "min_price": row["min_price"],
+                "max_price": row["max_price"],
+            }
+        )
+    conn.close()
+    return price_rollups
+
+
+@instrumented
+def delete_price_rollups(tracked_search_name):
+    """Deletes all records in the 'price_rollups' table which have the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM price_rollups
+            WHERE tracked_search_name = ?
+        """,
+        (tracked_search_name,),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def delete_price_rollups_before(day, batch_size):
+    """Deletes up to 'batch_size' records in the 'price_rollups' table whose 'day' is before 'day', and returns the number of deleted records."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM price_rollups
+            WHERE rowid IN (
+                SELECT rowid
+                FROM price_rollups
+                WHERE day < ?
+                LIMIT ?
+            )
+        """,
+        (day, batch_size),
+    )
+    number_of_deleted_records = cur.rowcount
+    conn.commit()
+    conn.close()
+    return number_of_deleted_records
+
+
+@instrumented
+def drop_price_rollups_table():
+    """Drops the 'price_rollups' table."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DROP TABLE price_rollups
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def create_listing_documents_table():
+    """Creates the 'listing_documents' table, its 'listing_documents_fts' full-text index and the triggers that keep them in sync if they don't exist."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    # 'document_id' is an explicit INTEGER PRIMARY KEY so that VACUUM never renumbers
+    # the rowids that 'listing_documents_fts' refers to
+    cur.execute(
+        """
+            CREATE TABLE IF NOT EXISTS listing_documents (
+                document_id INTEGER PRIMARY KEY,
+                listing_id INTEGER NOT NULL,
+                tracked_search_name TEXT NOT NULL,
+                title TEXT NOT NULL,
+                description TEXT NOT NULL,
+                username TEXT NOT NULL,
+                price TEXT,
+                price_value REAL,
+                seen_at INTEGER NOT NULL,
+                protection TEXT,
+                UNIQUE (listing_id, tracked_search_name)
+            )
+        """
+    )
+    # Add the 'protection' column to tables created before it existed
+    cur.execute("PRAGMA table_info(listing_documents)")
+    if "protection" not in [row["name"] for row in cur.fetchall()]:
+        cur.execute(
+            """
+                ALTER TABLE listing_documents
+                ADD COLUMN protection TEXT
+            """
+        )
+    cur.execute(
+        """
+            CREATE INDEX IF NOT EXISTS listing_documents_by_time
+            ON listing_documents (seen_at)
+        """
+    )
+    cur.execute(
+        """
+            CREATE VIRTUAL TABLE IF NOT EXISTS listing_documents_fts USING fts5 (
+                title,
+                description,
+                username,
+                content='listing_documents',
+                content_rowid='document_id'
+            )
+        """
+    )
+    cur.execute(
+        """
+            CREATE TRIGGER IF NOT EXISTS listing_documents_after_insert
+            AFTER INSERT ON listing_documents
+            BEGIN
+                INSERT INTO listing_documents_fts (rowid, title, description, username)
+                VALUES (new.document_id, new.title, new.description, new.username);
+            END
+        """
+    )
+    cur.execute(
+        """
+            CREATE TRIGGER IF NOT EXISTS listing_documents_after_delete
+            AFTER DELETE ON listing_documents
+            BEGIN
+                INSERT INTO listing_documents_fts (listing_documents_fts, rowid, title, description, username)
+                VALUES ('delete', old.document_id, old.title, old.description, old.username);
+            END
+        """
+    )
+    cur.execute(
+        """
+            CREATE TRIGGER IF NOT EXISTS listing_documents_after_update
+            AFTER UPDATE ON listing_documents
+            BEGIN
+                INSERT INTO listing_documents_fts (listing_documents_fts, rowid, title, description, username)
+                VALUES ('delete', old.document_id, old.title, old.description, old.username);
+                INSERT INTO listing_documents_fts (rowid, title, description, username)
+                VALUES (new.document_id, new.title, new.description, new.username);
+            END
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def search_listing_documents(
+    match_query, min_price, max_price, since_seen_at, limit, offset
+):
+    """Returns the records in the 'listing_documents' table which match the full-text 'match_query' and the given price and time bounds, best match first."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            SELECT listing_documents.*
+            FROM listing_documents_fts
+            JOIN listing_documents ON listing_documents.document_id = listing_documents_fts.rowid
+            WHERE listing_documents_fts MATCH ?
+            AND (? IS NULL OR listing_documents.price_value >= ?)
+            AND (? IS NULL OR listing_documents.price_value <= ?)
+            AND listing_documents.seen_at >= ?
+            ORDER BY listing_documents_fts.rank
+            LIMIT ? OFFSET ?
+        """,
+        (
+            match_query,
+            min_price,
+            min_price,
+            max_price,
+            max_price,
+            since_seen_at,
+            limit,
+            offset,
+        ),
+    )
+    rows = cur.fetchall()
+    listing_documents = []
+    for row in rows:
+        listing_documents.append(
+            {
+                "listing_id": row["listing_id"],
+                "tracked_search_name": row["tracked_search_name"],
+                "title": row["title"],
+                "username": row["username"],
+                "price": row["price"],
+                "price_value": row["price_value"],
+                "seen_at": row["seen_at"],
+                "url": f"{CAROUSELL_BASE_URL}/p/{row['listing_id']}/",
+            }
+        )
+    conn.close()
+    return listing_documents
+
+
+@instrumented
+def delete_listing_documents(tracked_search_name):
+    """Deletes all records in the 'listing_documents' table which have the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM listing_documents
+            WHERE tracked_search_name = ?
+        """,
+        (tracked_search_name,),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def delete_listing_documents_before(seen_at, batch_size):
+    """Deletes up to 'batch_size' records in the 'listing_documents' table which were first seen before 'seen_at', and returns the number of deleted records."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM listing_documents
+            WHERE document_id IN (
+                SELECT document_id
+                FROM listing_documents
+                WHERE seen_at < ?
+                LIMIT ?
+            )
+        """,
+        (seen_at, batch_size),
+    )
+    number_of_deleted_records = cur.rowcount
+    conn.commit()
+    conn.close()
+    return number_of_deleted_records
+
+
+@instrumented
+def drop_listing_documents_table():
+    """Drops the 'listing_documents' table and its 'listing_documents_fts' full-text index."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DROP TABLE listing_documents_fts
+        """
+    )
+    cur.execute(
+        """
+            DROP TABLE listing_documents
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def get_latest_listing_documents(tracked_search_name, number_of_listings):
+    """Returns the most recently seen 'number_of_listings' records in the 'listing_documents' table which have the matching 'tracked_search_name', as 'Listing' records."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    # Listings seen in the same scrape are inserted newest first
+    cur.execute(
+        """
+            SELECT *
+            FROM listing_documents
+            WHERE tracked_search_name = ?
+            ORDER BY seen_at DESC, document_id ASC
+            LIMIT ?
+        """,
+        (tracked_search_name, number_of_listings),
+    )
+    rows = cur.fetchall()
+    listings = []
+    for row in rows:
+        listings.append(
+            Listing(
+                listing_id=row["listing_id"],
+                username=row["username"],
+                date=None,
+                protection=row["protection"],
+                bumped=None,
+                title=row["title"],
+                price=row["price"],
+                price_value=row["price_value"],
+                description=row["description"],
+                seller_profile_url=None,
+            )
+        )
+    conn.close()
+    return listings
+
+
+@instrumented
+def create_tracked_search_statuses_table():
+    """Creates the 'tracked_search_statuses' table if it doesn't exist."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            CREATE TABLE IF NOT EXISTS tracked_search_statuses (
+                tracked_search_name TEXT PRIMARY KEY NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                updated_at INTEGER NOT NULL,
+                FOREIGN KEY(tracked_search_name) REFERENCES tracked_searches(tracked_search_name)
+            )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def upsert_tracked_search_status(tracked_search_name, status, error=None):
+    """Inserts or replaces the record in the 'tracked_search_statuses' table which has the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            INSERT OR REPLACE INTO tracked_search_statuses
+            VALUES (?, ?, ?, ?)
+        """,
+        (tracked_search_name, status, error, int(time.time())),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def update_tracked_search_statuses(status, new_status, error=None):
+    """Updates all records in the 'tracked_search_statuses' table which have the matching 'status' to 'new_status', and returns the number of updated records."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            UPDATE tracked_search_statuses
+            SET status = ?, error = ?, updated_at = ?
+            WHERE status = ?
+        """,
+        (new_status, error, int(time.time()), status),
+    )
+    number_of_updated_records = cur.rowcount
+    conn.commit()
+    conn.close()
+    return number_of_updated_records
+
+
+@instrumented
+def get_tracked_search_status(tracked_search_name):
+    """Returns the record in the 'tracked_search_statuses' table which has the matching 'tracked_search_name', or None if there is no such record."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            SELECT *
+            FROM tracked_search_statuses
+            WHERE tracked_search_name = ?
+        """,
+        (tracked_search_name,),
+    )
+    row = cur.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return {
+        "tracked_search_name": row["tracked_search_name"],
+        "status": row["status"],
+        "error": row["error"],
+        "updated_at": row["updated_at"],
+    }
+
+
+@instrumented
+def delete_tracked_search_status(tracked_search_name):
+    """Deletes the record in the 'tracked_search_statuses' table which has the matching 'tracked_search_name'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DELETE FROM tracked_search_statuses
+            WHERE tracked_search_name = ?
+        """,
+        (tracked_search_name,),
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def drop_tracked_search_statuses_table():
+    """Drops the 'tracked_search_statuses' table."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+            DROP TABLE tracked_search_statuses
+        """
+    )
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def enable_incremental_vacuum():
+    """Switches the database to incremental auto-vacuum if it isn't already, which rebuilds an existing database once."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute("PRAGMA auto_vacuum")
+    auto_vacuum_mode = cur.fetchone()[0]
+    # 2 is INCREMENTAL, and changing the mode of an existing database only takes effect after a VACUUM
+    if auto_vacuum_mode != 2:
+        cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cur.execute("VACUUM")
+    conn.close()
+
+
+@instrumented
+def enable_write_ahead_log():
+    """Switches the database to the write-ahead log journal mode, in which reads, including backups, don't block writes."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+
+@instrumented
+def get_page_counts():
+    """Returns the page size of the database, its number of pages and its number of free pages."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute("PRAGMA page_size")
+    page_size = cur.fetchone()[0]
+    cur.execute("PRAGMA page_count")
+    page_count = cur.fetchone()[0]
+    cur.execute("PRAGMA freelist_count")
+    freelist_count = cur.fetchone()[0]
+    conn.close()
+    return {
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": freelist_count,
+    }
+
+
+@instrumented
+def incremental_vacuum(number_of_pages):
+    """Returns up to 'number_of_pages' free pages of the database to the file system."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    # The pragma frees one page per step, so step through all of its rows
+    cur.execute(f"PRAGMA incremental_vacuum({int(number_of_pages)})").fetchall()
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def optimize_database(analysis_limit):
+    """Refreshes the query planner's statistics of the tables which need it, examining up to about 'analysis_limit' rows of each index."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    cur.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    cur.execute(
+        """
+            SELECT COUNT(*)
+            FROM sqlite_master
+            WHERE name = 'sqlite_stat1'
+        """
+    )
+    if cur.fetchone()[0] == 0:
+        # The tables have never been analysed, which 'PRAGMA optimize' doesn't do by itself
+        cur.execute("ANALYZE")
+    else:
+        # 0x10002 re-analyses any table whose statistics are out of date,
+        # not just the tables used by this connection
+        cur.execute("PRAGMA optimize = 0x10002")
+    conn.commit()
+    conn.close()
+
+
+@instrumented
+def backup_database(backup_location):
+    """Writes a compacted copy of the database, as of a single read transaction, to 'backup_location'."""
+    conn = connect_to_db()
+    cur = conn.cursor()
+    # With the write-ahead log, this reads a snapshot of the database, so writes
+    # go ahead while it runs and never force the copy to start over
+    cur.execute("VACUUM INTO ?", (backup_location,))
+    conn.close()
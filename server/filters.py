@@ -0,0 +1,79 @@
+"""Defines listing filter functions."""
+
+DEFAULT_FILTERS = {
+    "min_price": None,
+    "max_price": None,
+    "include_keywords": [],
+    "exclude_keywords": [],
+    "blocked_usernames": [],
+    "require_buyer_protection": False,
+}
+
+
+def parse_filters_form(form, current_filters):
+    """Returns a copy of 'current_filters' updated with the filter fields present in 'form'."""
+    filters = dict(current_filters)
+
+    for field in ("min_price", "max_price"):
+        if field in form:
+            value = form[field].strip()
+            # An empty value clears the price bound
+            filters[field] = float(value) if value else None
+
+    for field in ("include_keywords", "exclude_keywords", "blocked_usernames"):
+        if field in form:
+            # Comma-separated values, e.g. 'rtx 3080,founders edition'
+            filters[field] = [
+                value.strip().lower()
+                for value in form[field].split(",")
+                if value.strip()
+            ]
+
+    if "require_buyer_protection" in form:
+        filters["require_buyer_protection"] = form[
+            "require_buyer_protection"
+        ].strip().lower() in ("1", "true", "yes", "on")
+
+    return filters
+
+
+def listing_matches_filters(listing, filters):
+    """Returns True if the listing satisfies every rule in 'filters'."""
+    price_value = listing.price_value
+
+    # Listings whose price could not be parsed are not excluded by the price range
+    if price_value is not None:
+        if filters["min_price"] is not None and price_value < filters["min_price"]:
+            return False
+        if filters["max_price"] is not None and price_value > filters["max_price"]:
+            return False
+
+    if filters["require_buyer_protection"] and (
+        listing.protection != "Buyer Protection"
+    ):
+        return False
+
+    if (listing.username or "").lower() in filters["blocked_usernames"]:
+        return False
+
+    if filters["include_keywords"] or filters["exclude_keywords"]:
+        text = f"{listing.title or ''} {listing.description or ''}".lower()
+
+        # Every include keyword must appear in the title or description
+        for keyword in filters["include_keywords"]:
+            if keyword not in text:
+                return False
+
+        # No exclude keyword may appear in the title or description
+        for keyword in filters["exclude_keywords"]:
+            if keyword in text:
+                return False
+
+    return True
+
+
+def filter_listings(listings, filters):
+    """Returns the listings that satisfy every rule in 'filters'."""
+    return [
+        listing for listing in listings if listing_matches_filters(listing, filters)
+    ]
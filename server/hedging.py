@@ -0,0 +1,57 @@
+"""Defines the latency tracking and request budget used for hedged and retried requests."""
+
+import threading
+from collections import deque
+
+
+class LatencyTracker:
+    """Keeps the latencies of the most recent requests to estimate their percentiles."""
+
+    def __init__(self, window_size, min_samples, default_latency):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window_size)
+        self.min_samples = min_samples
+        self.default_latency = default_latency
+
+    def record(self, latency):
+        """Records the latency of a request."""
+        with self.lock:
+            self.latencies.append(latency)
+
+    def get_percentile(self, percentile):
+        """Returns the latency at 'percentile' (0 to 1) of the recent requests, or the default latency if there are too few of them."""
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.default_latency
+            sorted_latencies = sorted(self.latencies)
+        return sorted_latencies[
+            min(len(sorted_latencies) - 1, int(percentile * len(sorted_latencies)))
+        ]
+
+
+class RequestBudget:
+    """Limits extra requests, i.e. hedges and retries, to a fraction of the original requests.
+
+    Each original request adds 'ratio' tokens, up to 'max_tokens', and each extra
+    request spends one token, so extra requests can never exceed 'ratio' times the
+    original requests plus a small burst.
+    """
+
+    def __init__(self, ratio, max_tokens):
+        self.lock = threading.Lock()
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def record_request(self):
+        """Earns tokens for an original request."""
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self):
+        """Spends a token for an extra request and returns True, or returns False if the budget is exhausted."""
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
@@ -0,0 +1,40 @@
+"""Defines functions for running background jobs in the server."""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Threads which run one-off background jobs
+background_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="job")
+
+
+def run_periodically(func, interval):
+    """Runs 'func' every 'interval' seconds in a background thread."""
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                func()
+            except Exception:  # pylint: disable=broad-exception-caught
+                # Keep the job running even if a single run fails
+                logger.exception("Background job '%s' failed.", func.__name__)
+
+    thread = threading.Thread(target=run, name=func.__name__, daemon=True)
+    thread.start()
+    return thread
+
+
+def run_in_background(func, *args):
+    """Runs 'func' with the given arguments once in a background thread."""
+
+    def run():
+        try:
+            func(*args)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Background job '%s' failed.", func.__name__)
+
+    return background_executor.submit(run)
@@ -0,0 +1,172 @@
+"""Defines the database maintenance jobs, which prune old rows, compact the database and back it up."""
+
+import datetime
+import logging
+import os
+import time
+
+import db
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Get environment variables
+PRICE_OBSERVATION_RETENTION_DAYS = int(
+    os.environ.get("PRICE_OBSERVATION_RETENTION_DAYS", 30)
+)
+LISTING_DOCUMENT_RETENTION_DAYS = int(
+    os.environ.get("LISTING_DOCUMENT_RETENTION_DAYS", 90)
+)
+PRICE_ROLLUP_RETENTION_DAYS = int(os.environ.get("PRICE_ROLLUP_RETENTION_DAYS", 730))
+MAINTENANCE_INTERVAL = int(os.environ.get("MAINTENANCE_INTERVAL", 3600))
+BACKUP_DIRECTORY = os.environ.get("BACKUP_DIRECTORY")
+BACKUP_INTERVAL = int(os.environ.get("BACKUP_INTERVAL", 86400))
+BACKUPS_TO_KEEP = int(os.environ.get("BACKUPS_TO_KEEP", 7))
+
+# Minimum number of days of price observations kept, as the observations of the latest
+# rolled-up day are rolled up again and must not be pruned before then
+MIN_PRICE_OBSERVATION_RETENTION_DAYS = 2
+
+if PRICE_OBSERVATION_RETENTION_DAYS < MIN_PRICE_OBSERVATION_RETENTION_DAYS:
+    logger.warning(
+        "PRICE_OBSERVATION_RETENTION_DAYS is %d, but price observations are kept for at least %d days.",
+        PRICE_OBSERVATION_RETENTION_DAYS,
+        MIN_PRICE_OBSERVATION_RETENTION_DAYS,
+    )
+    PRICE_OBSERVATION_RETENTION_DAYS = MIN_PRICE_OBSERVATION_RETENTION_DAYS
+
+# Maximum number of rows deleted in each transaction, and the number of seconds
+# between transactions, so that pruning never holds the write lock for long
+PRUNE_BATCH_SIZE = 500
+PRUNE_BATCH_PAUSE = 0.05
+
+# Maximum number of free pages returned to the file system in each transaction
+VACUUM_BATCH_PAGES = 1000
+
+# Approximate number of rows of each index examined when refreshing the query planner's statistics
+ANALYSIS_LIMIT = 1000
+
+# Prefix of the names of the backup files
+BACKUP_FILE_PREFIX = "roundabarter-"
+
+
+def prune_in_batches(delete_batch, cutoff):
+    """Calls 'delete_batch' with 'cutoff' until it deletes less than a full batch, and returns the total number of deleted rows."""
+    number_of_deleted_rows = 0
+    while True:
+        number_of_deleted_batch_rows = delete_batch(cutoff, PRUNE_BATCH_SIZE)
+        number_of_deleted_rows += number_of_deleted_batch_rows
+        if number_of_deleted_batch_rows < PRUNE_BATCH_SIZE:
+            return number_of_deleted_rows
+
+        # Let scrapes write between batches
+        time.sleep(PRUNE_BATCH_PAUSE)
+
+
+def prune_old_rows():
+    """Deletes the rows which are older than their table's retention window, and returns the number of deleted rows by table."""
+    now = time.time()
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+
+    # The price roll-ups keep the price history of pruned price observations, as
+    # only the observations of the latest rolled-up day onwards are rolled up again
+    number_of_pruned_rows = {
+        "price_observations": prune_in_batches(
+            db.delete_price_observations_before,
+            int(now - PRICE_OBSERVATION_RETENTION_DAYS * 86400),
+        ),
+        "listing_documents": prune_in_batches(
+            db.delete_listing_documents_before,
+            int(now - LISTING_DOCUMENT_RETENTION_DAYS * 86400),
+        ),
+        "price_rollups": prune_in_batches(
+            db.delete_price_rollups_before,
+            (today - datetime.timedelta(days=PRICE_ROLLUP_RETENTION_DAYS)).isoformat(),
+        ),
+    }
+
+    for table, number_of_rows in number_of_pruned_rows.items():
+        metrics.DATABASE_PRUNED_ROWS.labels(table).inc(number_of_rows)
+
+    return number_of_pruned_rows
+
+
+def compact_database():
+    """Returns the free pages of the database to the file system in batches, and returns the number of reclaimed pages."""
+    number_of_reclaimed_pages = 0
+    free_pages = db.get_page_counts()["freelist_count"]
+    while free_pages > 0:
+        db.incremental_vacuum(VACUUM_BATCH_PAGES)
+        remaining_free_pages = db.get_page_counts()["freelist_count"]
+
+        # Stop if no pages could be reclaimed, e.g. if the database isn't in incremental auto-vacuum mode
+        if remaining_free_pages >= free_pages:
+            break
+
+        number_of_reclaimed_pages += free_pages - remaining_free_pages
+        free_pages = remaining_free_pages
+
+    metrics.DATABASE_RECLAIMED_PAGES.inc(number_of_reclaimed_pages)
+    return number_of_reclaimed_pages
+
+
+def record_database_size():
+    """Records the size and the number of free pages of the database, and returns the size in bytes."""
+    database_size = os.path.getsize(db.DATABASE_LOCATION)
+    metrics.DATABASE_FILE_BYTES.set(database_size)
+    metrics.DATABASE_FREE_PAGES.set(db.get_page_counts()["freelist_count"])
+    return database_size
+
+
+def run_maintenance():
+    """Prunes old rows, compacts the database and refreshes the query planner's statistics."""
+    start_time = time.perf_counter()
+    database_size_before = record_database_size()
+
+    number_of_pruned_rows = prune_old_rows()
+    number_of_reclaimed_pages = compact_database()
+    db.optimize_database(ANALYSIS_LIMIT)
+
+    database_size_after = record_database_size()
+    logger.info(
+        "Database maintenance took %.3fs: pruned %s, reclaimed %d pages, file size %d -> %d bytes.",
+        time.perf_counter() - start_time,
+        number_of_pruned_rows,
+        number_of_reclaimed_pages,
+        database_size_before,
+        database_size_after,
+    )
+
+
+def back_up_database():
+    """Backs up the database to a new file in 'BACKUP_DIRECTORY', and deletes all but the latest 'BACKUPS_TO_KEEP' backups."""
+    os.makedirs(BACKUP_DIRECTORY, exist_ok=True)
+    backup_name = f"{BACKUP_FILE_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}.db"
+    backup_location = os.path.join(BACKUP_DIRECTORY, backup_name)
+
+    # Write to a temporary file so that an unfinished backup is never mistaken for a complete one,
+    # removing any left over from an interrupted backup as 'VACUUM INTO' won't overwrite it
+    if os.path.exists(f"{backup_location}.tmp"):
+        os.remove(f"{backup_location}.tmp")
+    start_time = time.perf_counter()
+    db.backup_database(f"{backup_location}.tmp")
+    os.replace(f"{backup_location}.tmp", backup_location)
+    backup_seconds = time.perf_counter() - start_time
+
+    metrics.DATABASE_BACKUP_SECONDS.observe(backup_seconds)
+    metrics.DATABASE_LAST_BACKUP_TIMESTAMP.set(time.time())
+    logger.info(
+        "Backed up the database to '%s' (%d bytes) in %.3fs.",
+        backup_location,
+        os.path.getsize(backup_location),
+        backup_seconds,
+    )
+
+    # The timestamps in the backup names sort in the order the backups were taken
+    backup_names = sorted(
+        name
+        for name in os.listdir(BACKUP_DIRECTORY)
+        if name.startswith(BACKUP_FILE_PREFIX) and name.endswith(".db")
+    )
+    for old_backup_name in backup_names[:-BACKUPS_TO_KEEP]:
+        os.remove(os.path.join(BACKUP_DIRECTORY, old_backup_name))
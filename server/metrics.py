@@ -0,0 +1,138 @@
+"""Defines the Prometheus metrics of the server."""
+
+import time
+from functools import wraps
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets for latencies which are usually well under a second, e.g. DB calls and parsing
+FAST_LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+# Buckets for latencies which depend on Carousell, e.g. fetches and route handling
+SLOW_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+
+SCRAPE_FETCH_SECONDS = Histogram(
+    "roundabarter_scrape_fetch_seconds",
+    "Time taken to fetch a page of search results from Carousell.",
+    buckets=SLOW_LATENCY_BUCKETS,
+)
+
+SCRAPE_PARSE_SECONDS = Histogram(
+    "roundabarter_scrape_parse_seconds",
+    "Time taken to parse a page of search results into listings.",
+    buckets=FAST_LATENCY_BUCKETS,
+)
+
+SCRAPE_ERRORS = Counter(
+    "roundabarter_scrape_errors_total",
+    "Number of failed fetches or parses of a page of search results.",
+    ["error_type"],
+)
+
+SCRAPE_TRUNCATED = Counter(
+    "roundabarter_scrape_truncated_total",
+    "Number of scrapes for new listings which hit their page or time limit before reaching a seen listing, so that some new listings may have been missed.",
+)
+
+NEW_LISTINGS_PER_SCRAPE = Histogram(
+    "roundabarter_new_listings_per_scrape",
+    "Number of new listings found by each periodic scrape, before filtering.",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+
+DB_CALL_SECONDS = Histogram(
+    "roundabarter_db_call_seconds",
+    "Time taken by each database function.",
+    ["function"],
+    buckets=FAST_LATENCY_BUCKETS,
+)
+
+FETCH_HEDGES = Counter(
+    "roundabarter_fetch_hedges_total",
+    "Number of hedged fetches sent because the first fetch was slow.",
+)
+
+FETCH_HEDGE_WINS = Counter(
+    "roundabarter_fetch_hedge_wins_total",
+    "Number of hedged fetches which finished before the first fetch.",
+)
+
+FETCH_RETRIES = Counter(
+    "roundabarter_fetch_retries_total",
+    "Number of retried fetches.",
+)
+
+CIRCUIT_BREAKER_OPEN = Gauge(
+    "roundabarter_circuit_breaker_open",
+    "Whether requests to a host are currently being short-circuited (1) or not (0).",
+    ["host"],
+)
+
+REQUEST_SECONDS = Histogram(
+    "roundabarter_request_seconds",
+    "Time taken to handle each API request.",
+    ["method", "route", "status"],
+    buckets=SLOW_LATENCY_BUCKETS,
+)
+
+DATABASE_FILE_BYTES = Gauge(
+    "roundabarter_database_file_bytes",
+    "Size of the SQLite database file, as of the last maintenance run.",
+)
+
+DATABASE_FREE_PAGES = Gauge(
+    "roundabarter_database_free_pages",
+    "Number of unused pages in the SQLite database file, as of the last maintenance run.",
+)
+
+DATABASE_PRUNED_ROWS = Counter(
+    "roundabarter_database_pruned_rows_total",
+    "Number of rows deleted because they are older than the retention window.",
+    ["table"],
+)
+
+DATABASE_RECLAIMED_PAGES = Counter(
+    "roundabarter_database_reclaimed_pages_total",
+    "Number of free pages returned to the file system by incremental vacuums.",
+)
+
+DATABASE_BACKUP_SECONDS = Histogram(
+    "roundabarter_database_backup_seconds",
+    "Time taken to back up the SQLite database.",
+    buckets=SLOW_LATENCY_BUCKETS,
+)
+
+DATABASE_LAST_BACKUP_TIMESTAMP = Gauge(
+    "roundabarter_database_last_backup_timestamp_seconds",
+    "Unix time of the last successful backup of the SQLite database.",
+)
+
+
+def timed_db_call(func):
+    """Records the time taken by the 'func' database function in 'DB_CALL_SECONDS'."""
+
+    # Resolve the labelled histogram once rather than on every call
+    histogram = DB_CALL_SECONDS.labels(func.__name__)
+
+    @wraps(func)
+    def wrapped(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start_time)
+
+    return wrapped
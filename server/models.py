@@ -0,0 +1,53 @@
+"""Defines the record types that are passed between the scraper, the database and the API."""
+
+import os
+from typing import NamedTuple, Optional
+
+# Get environment variables
+# Point this at a stand-in server, e.g. for load testing, to avoid scraping Carousell itself
+CAROUSELL_BASE_URL = os.environ.get("CAROUSELL_BASE_URL", "https://www.carousell.sg")
+
+# Statuses of a tracked search in the 'tracked_search_statuses' table
+WARMING_UP = "warming_up"
+READY = "ready"
+FAILED = "failed"
+
+
+class Listing(NamedTuple):
+    """A Carousell listing, stored as a tuple rather than a per-listing dict to keep memory usage low."""
+
+    listing_id: int
+    username: str
+    date: str
+    protection: str
+    bumped: str
+    title: str
+    price: str
+    price_value: Optional[float]
+    description: str
+    seller_profile_url: str
+
+    @property
+    def url(self):
+        """Returns the URL of this listing."""
+        return f"{CAROUSELL_BASE_URL}/p/{self.listing_id}/"
+
+    def to_dict(self):
+        """Returns this listing in the JSON shape that is returned by the API."""
+        return {
+            "username": self.username,
+            "date": self.date,
+            "protection": self.protection,
+            "bumped": self.bumped,
+            "title": self.title,
+            "price": self.price,
+            "price_value": self.price_value,
+            "description": self.description,
+            "seller_profile_url": self.seller_profile_url,
+            "url": self.url,
+        }
+
+
+def listings_to_dicts(listings):
+    """Converts listings into the JSON shape that is returned by the API."""
+    return [listing.to_dict() for listing in listings]
@@ -0,0 +1,92 @@
+"""Defines price history functions."""
+
+import datetime
+import math
+
+import db
+
+# Relative width of each price bucket in the 'price_rollups' table, which bounds the
+# error of the percentiles that are computed from the roll-ups to about 1%
+BUCKET_GROWTH_FACTOR = 1.02
+
+
+def get_price_bucket(price_value):
+    """Returns the index of the logarithmic price bucket which contains 'price_value'."""
+    return int(math.log1p(price_value) / math.log(BUCKET_GROWTH_FACTOR))
+
+
+def rollup_price_observations():
+    """Rolls up the price observations of the latest rolled-up day onwards into per-day price buckets."""
+
+    # Re-roll the latest rolled-up day, as it may have been incomplete when it was last rolled up
+    since_day = db.get_latest_price_rollup_day()
+    if since_day is None:
+        since_day = "0000-00-00"
+        since_seen_at = 0
+    else:
+        since_seen_at = int(
+            datetime.datetime.fromisoformat(since_day)
+            .replace(tzinfo=datetime.timezone.utc)
+            .timestamp()
+        )
+
+    # Count each listing at most once per day, at its last observed price
+    price_rollups = {}
+    for tracked_search_name, day, price_value in db.get_daily_listing_prices(
+        since_seen_at
+    ):
+        key = (tracked_search_name, day, get_price_bucket(price_value))
+        if key not in price_rollups:
+            price_rollups[key] = [0, price_value, price_value]
+        price_rollup = price_rollups[key]
+        price_rollup[0] += 1
+        price_rollup[1] = min(price_rollup[1], price_value)
+        price_rollup[2] = max(price_rollup[2], price_value)
+
+    db.replace_price_rollups(
+        since_day,
+        [key + tuple(price_rollup) for key, price_rollup in price_rollups.items()],
+    )
+
+
+def get_percentile(price_rollups, count, percentile):
+    """Returns the approximate price at 'percentile' (0 to 1) from price roll-ups sorted by bucket."""
+    target_rank = percentile * (count - 1)
+
+    cumulative_count = 0
+    for price_rollup in price_rollups:
+        if target_rank < cumulative_count + price_rollup["count"]:
+            # Interpolate between the lowest and highest price in this bucket
+            if price_rollup["count"] == 1:
+                return price_rollup["min_price"]
+            fraction = (target_rank - cumulative_count) / (price_rollup["count"] - 1)
+            return price_rollup["min_price"] + fraction * (
+                price_rollup["max_price"] - price_rollup["min_price"]
+            )
+        cumulative_count += price_rollup["count"]
+
+    return price_rollups[-1]["max_price"]
+
+
+def get_price_stats(tracked_search_name, days):
+    """Returns the price statistics of a tracked search over the last 'days' days, or None if there are no observations."""
+    from_day = (
+        datetime.datetime.now(datetime.timezone.utc).date()
+        - datetime.timedelta(days=days - 1)
+    ).isoformat()
+
+    price_rollups = db.get_price_rollups(tracked_search_name, from_day)
+    if len(price_rollups) == 0:
+        return None
+
+    count = sum(price_rollup["count"] for price_rollup in price_rollups)
+
+    return {
+        "tracked_search_name": tracked_search_name,
+        "days": days,
+        "count": count,
+        "min": price_rollups[0]["min_price"],
+        "median": round(get_percentile(price_rollups, count, 0.5), 2),
+        "p90": round(get_percentile(price_rollups, count, 0.9), 2),
+        "max": price_rollups[-1]["max_price"],
+    }
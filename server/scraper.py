@@ -1,9 +1,25 @@
 """Defines Carousell scraper functions."""
 
+import logging
+import os
 import re
 import random
-from bs4 import BeautifulSoup
-import requests
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import islice
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+# BeautifulSoup and requests are imported inside the functions which use them, so that
+# importing the scraper doesn't slow down the server's start-up. The start-up
+# initialisation imports them in the background (see 'startup.warm_up_scraper').
+import metrics
+from hedging import LatencyTracker, RequestBudget
+from circuit_breaker import CircuitOpenError, get_circuit_breaker
+import tracing
+from models import CAROUSELL_BASE_URL, Listing
+
+logger = logging.getLogger(__name__)
 
 USER_AGENTS_LIST = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/93.0.4577.82 Safari/537.36",
@@ -18,28 +34,239 @@ USER_AGENTS_LIST = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.164 Safari/537.36",
 ]
 
+# Get environment variables
+# Hedged fetches are off unless enabled
+HEDGE_FETCHES = os.environ.get("HEDGE_FETCHES", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "0.95"))
+
+# Maximum number of pages of search results fetched in a single scrape
+MAX_PAGES = 10
+
+# Number of seconds within which a scrape for new listings must finish, which keeps it
+# well within the bot's timeout for '/get-new-listings'
+SCRAPE_TIME_LIMIT = 15
+
+# Maximum number of seconds to wait for Carousell to respond to a fetch
+FETCH_TIMEOUT = 3
+
+# Maximum number of times a failed fetch is retried
+MAX_FETCH_RETRIES = 1
+
+# Base number of seconds to wait before retrying a failed fetch
+RETRY_BACKOFF = 0.25
+
+# Hedges and retries may add at most 10% to the number of fetches, plus a burst of 10
+fetch_budget = RequestBudget(ratio=0.1, max_tokens=10)
+
+# Latencies of recent fetch attempts, which decide when a fetch is hedged
+fetch_latencies = LatencyTracker(window_size=200, min_samples=20, default_latency=1.0)
+
+# Threads which run hedges, which the request budget keeps to a fraction of all fetches
+hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="fetch")
+
+
+def parse_price(price):
+    """Parses a listing price string (e.g. 'S$1,200', 'FREE') into a number, or returns None if it cannot be parsed."""
+    if price is None:
+        return None
+
+    if price.strip().upper() == "FREE":
+        return 0.0
+
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", price)
+    if match is None:
+        return None
+
+    return float(match.group().replace(",", ""))
+
+
+class CarousellUnavailableError(Exception):
+    """Raised when Carousell cannot be scraped because it is failing, slow or unreachable."""
+
+
+def fetch_page_once(url, user_agent, cancelled=None, timeout=FETCH_TIMEOUT):
+    """Fetches the specified URL once with the given user agent and returns the HTML of the page, or None if 'cancelled' was set before the page was read."""
 
-def scrape_latest_listings(url, number_of_listings=5):
-    """Scrapes and returns the listing data of the latest listings from the specified URL."""
-    response = requests.get(
-        url, headers={"User-Agent": random.choice(USER_AGENTS_LIST)}, timeout=3
+    # Don't add to the load of a host that keeps failing
+    circuit_breaker = get_circuit_breaker(urlsplit(url).netloc)
+    circuit_breaker.before_request()
+
+    import requests  # pylint: disable=import-outside-toplevel
+
+    start_time = time.perf_counter()
+    try:
+        try:
+            # Stream the response so that the body isn't downloaded if this fetch was cancelled
+            response = requests.get(
+                url, headers={"User-Agent": user_agent}, timeout=timeout, stream=True
+            )
+        except Exception:
+            circuit_breaker.record_failure()
+            raise
+
+        # Server errors and rate limiting mean the host is struggling, whereas other
+        # error responses mean the host is up but the request was wrong
+        if response.status_code >= 500 or response.status_code == 429:
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
+
+        with response:
+            if cancelled is not None and cancelled.is_set():
+                # Another fetch of this page already finished
+                return None
+
+            response.raise_for_status()
+            return response.text
+
+    finally:
+        # Record every attempt, including failed ones and slow ones that lost to a hedge,
+        # so that the latency percentiles aren't biased towards fast fetches
+        fetch_latencies.record(time.perf_counter() - start_time)
+
+
+def start_primary_fetch(url, user_agent, cancelled, timeout):
+    """Starts fetching the specified URL in a thread of its own and returns a future of the page's HTML.
+
+    Primary fetches don't go through 'hedge_executor', so they are never capped by its
+    number of threads, and the hedging delay never includes time spent queueing.
+    """
+    future = Future()
+    future.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            future.set_result(fetch_page_once(url, user_agent, cancelled, timeout))
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            future.set_exception(error)
+
+    threading.Thread(target=run, name="fetch", daemon=True).start()
+    return future
+
+
+def fetch_page_hedged(url, timeout):
+    """Fetches the specified URL, and fetches it again with a different user agent if the first fetch is slower than most recent fetches, returning whichever finishes first."""
+    primary_user_agent, hedge_user_agent = random.sample(USER_AGENTS_LIST, 2)
+    cancelled = threading.Event()
+
+    primary = start_primary_fetch(url, primary_user_agent, cancelled, timeout)
+
+    # Wait for the primary fetch for as long as most recent fetches have taken
+    done, _ = wait([primary], timeout=fetch_latencies.get_percentile(HEDGE_PERCENTILE))
+    if done or not fetch_budget.try_spend():
+        return primary.result()
+
+    metrics.FETCH_HEDGES.inc()
+    hedge = hedge_executor.submit(
+        fetch_page_once, url, hedge_user_agent, cancelled, timeout
     )
 
-    soup = BeautifulSoup(response.text, "lxml")
+    # Take the first fetch which succeeds and cancel the other
+    pending = {primary, hedge}
+    last_error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                page_html = future.result()
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                last_error = error
+                continue
+
+            cancelled.set()
+            for pending_future in pending:
+                pending_future.cancel()
+            if future is hedge:
+                metrics.FETCH_HEDGE_WINS.inc()
+            return page_html
+
+    raise last_error
+
 
+def is_retryable(error):
+    """Returns True if a failed fetch may succeed if it is retried."""
+    import requests  # pylint: disable=import-outside-toplevel
+
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return False
+
+
+def fetch_page(url, deadline=None):
+    """Fetches the specified URL and returns the HTML of the page, hedging and retrying within the request budget and, if 'deadline' is given, giving up by the 'time.monotonic()' time 'deadline'."""
+    import requests  # pylint: disable=import-outside-toplevel
+
+    fetch_budget.record_request()
+
+    for attempt in range(MAX_FETCH_RETRIES + 1):
+        # Don't wait for Carousell beyond the deadline
+        timeout = FETCH_TIMEOUT
+        if deadline is not None:
+            timeout = max(0.1, min(FETCH_TIMEOUT, deadline - time.monotonic()))
+
+        try:
+            if HEDGE_FETCHES:
+                return fetch_page_hedged(url, timeout)
+            return fetch_page_once(
+                url, random.choice(USER_AGENTS_LIST), timeout=timeout
+            )
+
+        except requests.RequestException as error:
+            # Back off with jitter so that retries from many searches don't arrive together
+            backoff = random.uniform(0, RETRY_BACKOFF * 2**attempt)
+
+            # Only retry failures that may be transient, only if the retry can wait
+            # as long as a full fetch before the deadline, and only while the budget allows
+            if (
+                attempt == MAX_FETCH_RETRIES
+                or not is_retryable(error)
+                or (
+                    deadline is not None
+                    and time.monotonic() + backoff + FETCH_TIMEOUT > deadline
+                )
+                or not fetch_budget.try_spend()
+            ):
+                raise
+
+            metrics.FETCH_RETRIES.inc()
+            time.sleep(backoff)
+
+
+def get_next_page_url(soup, url, next_page_number):
+    """Returns the URL of the next page of search results."""
+
+    # Prefer the page's own link to the next page of results, if it has one
+    next_page_link = soup.find(["a", "link"], rel="next", href=True)
+    if next_page_link is not None:
+        return urljoin(url, next_page_link["href"])
+
+    # Otherwise, request the next page through the 'page' query parameter
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    query_params = [(key, value) for key, value in parse_qsl(query) if key != "page"]
+    query_params.append(("page", str(next_page_number)))
+    return urlunsplit((scheme, netloc, path, urlencode(query_params), fragment))
+
+
+def parse_listing_cards(soup):
+    """Parses the listing cards of a page of search results and yields them as 'Listing' records."""
     listing_cards = soup.main.find_all(
         attrs={"data-testid": re.compile(r"^listing-card-\d")}
     )
 
-    latest_listing_data = []
-
-    for listing_card in listing_cards[0:number_of_listings]:
-        listing_id = listing_card["data-testid"].split("-")[-1]
-        url = f"https://www.carousell.sg/p/{listing_id}/"
+    for listing_card in listing_cards:
+        listing_id = int(listing_card["data-testid"].split("-")[-1])
 
         p_tags = listing_card.find_all("p")
 
-        p_tags_data = list(map(lambda p_tag: p_tag.string, p_tags))
+        # Copy each string out of the parse tree so that listings don't keep the whole tree alive
+        p_tags_data = list(
+            map(
+                lambda p_tag: None if p_tag.string is None else str(p_tag.string),
+                p_tags,
+            )
+        )
 
         if p_tags_data[2] != "Buyer Protection":
             p_tags_data.insert(2, "No Buyer Protection")
@@ -47,24 +274,117 @@ def scrape_latest_listings(url, number_of_listings=5):
         if p_tags_data[3] != "Bumped":
             p_tags_data.insert(3, "Not Bumped")
 
-        a_tags = listing_card.find_all("a")
+        seller_profile_url = f"{CAROUSELL_BASE_URL}{listing_card.find('a')['href']}"
 
-        a_tags_data = list(
-            map(lambda a_tag: f"https://www.carousell.sg{a_tag['href']}", a_tags)
+        yield Listing(
+            listing_id=listing_id,
+            username=p_tags_data[0],
+            date=p_tags_data[1],
+            protection=p_tags_data[2],
+            bumped=p_tags_data[3],
+            title=p_tags_data[4],
+            price=p_tags_data[5],
+            price_value=parse_price(p_tags_data[5]),
+            description=p_tags_data[6],
+            seller_profile_url=seller_profile_url,
         )
 
-        listing_data = {
-            "username": p_tags_data[0],
-            "date": p_tags_data[1],
-            "protection": p_tags_data[2],
-            "bumped": p_tags_data[3],
-            "title": p_tags_data[4],
-            "price": p_tags_data[5],
-            "description": p_tags_data[6],
-            "seller_profile_url": a_tags_data[0],
-            "url": url,
-        }
-
-        latest_listing_data.append(listing_data)
-
-    return latest_listing_data
+
+def iter_listings(url, max_pages=MAX_PAGES, time_limit=None):
+    """Lazily yields the listings from the specified URL, newest first, fetching each page of results only when it is needed and, if 'time_limit' is given, only within 'time_limit' seconds of the first fetch.
+
+    Returns True if it stopped at 'max_pages' or 'time_limit' rather than at the end of the search results.
+    """
+    # pylint: disable=import-outside-toplevel
+    import requests
+    from bs4 import BeautifulSoup
+
+    yielded_listing_ids = set()
+    page_url = url
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+
+    for page_number in range(1, max_pages + 1):
+        # Stop before fetching another page that might not be fetched before the
+        # deadline, handing out the listings of the pages fetched so far
+        if (
+            page_number > 1
+            and deadline is not None
+            and time.monotonic() + FETCH_TIMEOUT > deadline
+        ):
+            return True
+
+        try:
+            with metrics.SCRAPE_FETCH_SECONDS.time(), tracing.span(
+                "scrape.fetch", url=page_url
+            ):
+                page_html = fetch_page(page_url, deadline)
+
+            with metrics.SCRAPE_PARSE_SECONDS.time(), tracing.span("scrape.parse"):
+                soup = BeautifulSoup(page_html, "lxml")
+                page_listings = list(parse_listing_cards(soup))
+                next_page_url = get_next_page_url(soup, url, page_number + 1)
+        except Exception as error:
+            metrics.SCRAPE_ERRORS.labels(type(error).__name__).inc()
+            if isinstance(error, (requests.RequestException, CircuitOpenError)):
+                raise CarousellUnavailableError(str(error)) from error
+            raise
+
+        # Release the parse tree before handing out this page's listings
+        del soup
+
+        page_has_unseen_listings = False
+        for listing in page_listings:
+            # Skip listings that were already yielded from an earlier page
+            if listing.listing_id in yielded_listing_ids:
+                continue
+
+            yielded_listing_ids.add(listing.listing_id)
+            page_has_unseen_listings = True
+            yield listing
+
+        # Stop if this page has no further listings, e.g. when it is the last page
+        # or when the site ignores the requested page and returns an earlier one
+        if not page_has_unseen_listings:
+            return False
+
+        page_url = next_page_url
+
+    # The last page allowed still had unseen listings
+    return True
+
+
+def scrape_latest_listings(url, number_of_listings=5, time_limit=None):
+    """Scrapes and returns the latest listings from the specified URL as 'Listing' records, within 'time_limit' seconds if it is given."""
+    return list(islice(iter_listings(url, time_limit=time_limit), number_of_listings))
+
+
+def scrape_new_listings(url, seen_listing_urls, max_pages=MAX_PAGES):
+    """Lazily yields the listings from the specified URL that are newer than every listing in 'seen_listing_urls'."""
+
+    # Without any seen listings there is nothing to stop at, so only look at the first page
+    if len(seen_listing_urls) == 0:
+        max_pages = 1
+
+    listings = iter_listings(url, max_pages, SCRAPE_TIME_LIMIT)
+    while True:
+        try:
+            listing = next(listings)
+        except StopIteration as stop:
+            # The scrape stopped before reaching a seen listing, so the new listings on the
+            # pages that weren't fetched are missed, as the newest listings are stored as seen
+            if stop.value and len(seen_listing_urls) > 0:
+                metrics.SCRAPE_TRUNCATED.inc()
+                logger.warning(
+                    "The scrape of '%s' stopped at its page or time limit before reaching a seen listing, so some new listings may have been missed.",
+                    url,
+                )
+            return
+
+        if listing.url in seen_listing_urls:
+            # A bumped listing that was already seen can appear above new listings,
+            # so only stop at a seen listing that was not bumped
+            if listing.bumped == "Bumped":
+                continue
+            return
+
+        yield listing
@@ -0,0 +1,152 @@
+"""Defines the one-time start-up initialisation of the server and its timing report."""
+
+import logging
+import os
+import threading
+import time
+
+import db
+import jobs
+import maintenance
+import price_history
+from models import FAILED, WARMING_UP
+
+logger = logging.getLogger(__name__)
+
+# Number of seconds between roll-ups of the price observations
+PRICE_ROLLUP_INTERVAL = 900
+
+# Set once the start-up initialisation has finished
+ready = threading.Event()
+
+# Names and durations in seconds of the start-up steps, in the order they ran
+timings = []
+
+# Error of the start-up initialisation, if it failed
+startup_error = None
+
+
+def get_process_age():
+    """Returns the number of seconds since this process started, or None if it can't be read."""
+    try:
+        with open("/proc/self/stat", encoding="utf-8") as stat_file:
+            # The process name may contain spaces, so count the fields from after it
+            stat_fields = stat_file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", encoding="utf-8") as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    # The start time is the 22nd field of the stat file, in clock ticks since boot
+    started_at = int(stat_fields[19]) / os.sysconf("SC_CLK_TCK")
+    return uptime - started_at
+
+
+def create_tables():
+    """Creates the database tables that do not exist yet."""
+    db.create_tracked_searches_table()
+    db.create_listings_table()
+    db.create_subscriptions_table()
+    db.create_filters_table()
+    db.create_price_observations_table()
+    db.create_price_rollups_table()
+    db.create_listing_documents_table()
+    db.create_tracked_search_statuses_table()
+
+
+def fail_interrupted_warm_ups():
+    """Marks the tracked searches whose warm-up scrape was queued or running when the server stopped as failed, so that their baseline listings are recorded by their next scrape."""
+    number_of_interrupted_warm_ups = db.update_tracked_search_statuses(
+        WARMING_UP, FAILED, "The warm-up scrape was interrupted by a restart."
+    )
+    if number_of_interrupted_warm_ups > 0:
+        logger.warning(
+            "Marked %d interrupted warm-up scrapes as failed.",
+            number_of_interrupted_warm_ups,
+        )
+
+
+def warm_up_scraper():
+    """Imports the scraper's HTML parsing and HTTP dependencies so that the first scrape doesn't pay for them."""
+    # pylint: disable=import-outside-toplevel,unused-import
+    import bs4
+    import lxml.etree
+    import requests
+
+
+def warm_up_database():
+    """Reads the tracked searches so that the database file is opened and its first pages are cached."""
+    db.get_tracked_searches()
+
+
+def start_background_jobs():
+    """Starts the periodic background jobs."""
+    # Periodically roll up the price observations into per-day price buckets
+    jobs.run_periodically(
+        price_history.rollup_price_observations, PRICE_ROLLUP_INTERVAL
+    )
+
+    # Periodically prune old rows and compact the database
+    jobs.run_periodically(maintenance.run_maintenance, maintenance.MAINTENANCE_INTERVAL)
+
+    # Periodically back up the database, if a backup directory is set
+    if maintenance.BACKUP_DIRECTORY is not None:
+        jobs.run_periodically(maintenance.back_up_database, maintenance.BACKUP_INTERVAL)
+
+
+# Start-up steps, in the order they run
+STARTUP_STEPS = (
+    ("enable_incremental_vacuum", db.enable_incremental_vacuum),
+    ("enable_write_ahead_log", db.enable_write_ahead_log),
+    ("create_tables", create_tables),
+    ("fail_interrupted_warm_ups", fail_interrupted_warm_ups),
+    ("warm_up_scraper", warm_up_scraper),
+    ("warm_up_database", warm_up_database),
+    ("start_background_jobs", start_background_jobs),
+)
+
+
+def initialise():
+    """Runs the start-up steps once, timing each of them, and then marks the server as ready."""
+    global startup_error  # pylint: disable=global-statement
+
+    # Time from the start of the process until the API module was imported
+    process_age = get_process_age()
+    if process_age is not None:
+        timings.append(("imports", process_age))
+
+    for step_name, step in STARTUP_STEPS:
+        start_time = time.perf_counter()
+        try:
+            step()
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            startup_error = f"{step_name} failed: {error}"
+            logger.exception("Start-up step '%s' failed.", step_name)
+            return
+        finally:
+            timings.append((step_name, time.perf_counter() - start_time))
+
+    ready.set()
+    logger.info("Server is ready. Start-up timings: %s", format_timings())
+
+
+def start_initialisation():
+    """Runs the start-up initialisation in a background thread so that the server can accept connections straight away."""
+    thread = threading.Thread(target=initialise, name="startup", daemon=True)
+    thread.start()
+    return thread
+
+
+def format_timings():
+    """Returns the start-up timings as a human-readable string."""
+    return ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings)
+
+
+def get_startup_report():
+    """Returns whether the server is ready and how long each start-up step took."""
+    return {
+        "ready": ready.is_set(),
+        "error": startup_error,
+        "timings": {name: round(seconds, 4) for name, seconds in timings},
+        "total_seconds": round(sum(seconds for _, seconds in timings), 4),
+    }
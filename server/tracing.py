@@ -0,0 +1,149 @@
+"""Defines tracing and profiling functions."""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# Get environment variables
+# Tracing is disabled unless a trace file is given
+TRACE_FILE = os.environ.get("TRACE_FILE")
+PROFILE_DIRECTORY = os.environ.get("PROFILE_DIRECTORY", "/tmp/roundabarter-profiles")
+
+# Name of the HTTP header that carries the trace ID between the bot and the server
+TRACE_ID_HEADER = "X-Trace-Id"
+
+# Number of functions listed in the text summary of each profile
+PROFILE_SUMMARY_LENGTH = 40
+
+# Trace ID and span ID of the span that is currently running in this thread
+current_trace_id = ContextVar("current_trace_id", default=None)
+current_span_id = ContextVar("current_span_id", default=None)
+
+trace_file_lock = threading.Lock()
+
+profiling_lock = threading.Lock()
+number_of_requests_to_profile = 0
+
+
+def new_id():
+    """Returns a new random trace or span ID."""
+    return uuid.uuid4().hex[:16]
+
+
+def write_span(span):
+    """Appends a span to the trace file as a line of JSON."""
+    line = json.dumps(span) + "\n"
+    with trace_file_lock:
+        with open(TRACE_FILE, "a", encoding="utf-8") as trace_file:
+            trace_file.write(line)
+
+
+def start_trace(trace_id=None):
+    """Starts a trace in this thread with the given trace ID, or a new one, and returns the trace ID."""
+    trace_id = trace_id or new_id()
+    current_trace_id.set(trace_id)
+    current_span_id.set(None)
+    return trace_id
+
+
+@contextmanager
+def span(name, **attributes):
+    """Records the time taken by the code in this block as a span of the current trace."""
+    if TRACE_FILE is None:
+        # Tracing is disabled, so do as little work as possible
+        yield
+        return
+
+    span_id = new_id()
+    parent_span_id = current_span_id.get()
+    token = current_span_id.set(span_id)
+    start_time = time.time()
+    start_counter = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as exception:
+        error = type(exception).__name__
+        raise
+    finally:
+        current_span_id.reset(token)
+        write_span(
+            {
+                "trace_id": current_trace_id.get(),
+                "span_id": span_id,
+                "parent_span_id": parent_span_id,
+                "name": name,
+                "start_time": start_time,
+                "duration": time.perf_counter() - start_counter,
+                "error": error,
+                "attributes": attributes,
+            }
+        )
+
+
+def traced(name):
+    """Records each call of the decorated function as a span named 'name'."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapped(*args, **kwargs):
+            if TRACE_FILE is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+def profile_next_requests(number_of_requests):
+    """Profiles the next 'number_of_requests' requests that the server handles."""
+    global number_of_requests_to_profile  # pylint: disable=global-statement
+    with profiling_lock:
+        number_of_requests_to_profile = number_of_requests
+
+
+def start_profiling_if_requested():
+    """Starts and returns a profiler for this request if requests are being profiled, otherwise returns None."""
+    global number_of_requests_to_profile  # pylint: disable=global-statement
+    if number_of_requests_to_profile == 0:
+        return None
+
+    with profiling_lock:
+        if number_of_requests_to_profile == 0:
+            return None
+        number_of_requests_to_profile -= 1
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profiling(profiler, label):
+    """Stops the profiler and writes its results to the profile directory, named after 'label'."""
+    profiler.disable()
+
+    os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+    file_path = os.path.join(
+        PROFILE_DIRECTORY, f"{time.strftime('%Y%m%d-%H%M%S')}-{label}"
+    )
+
+    # Raw results, for e.g. 'python -m pstats' or snakeviz
+    profiler.dump_stats(f"{file_path}.prof")
+
+    # Human-readable summary of the most expensive functions
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(
+        PROFILE_SUMMARY_LENGTH
+    )
+    with open(f"{file_path}.txt", "w", encoding="utf-8") as summary_file:
+        summary_file.write(summary.getvalue())